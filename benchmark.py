@@ -0,0 +1,285 @@
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+import itemdb
+import snapshot_diff
+import rules
+import main as bot
+
+
+CSV_HEADERS = 'c_classid;c_instanceid;c_price;c_offers;c_popularity;c_rarity;c_quality;c_heroid;c_slot;c_stickers;c_market_name;c_market_name_en;c_market_hash_name'
+
+def generate_sticker_ids(count: int, seed: int = 0):
+    """Генерирует ID стикеров синтетического справочника
+
+    Returns:
+        list: ID стикеров (строки, как в базе данных маркета)
+    """
+    rnd = random.Random(seed)
+    return [str(sticker_id) for sticker_id in rnd.sample(range(10**9, 10**10), count)]
+
+def generate_stickers_file(file_name: str, sticker_ids: list):
+    """Генерирует синтетический stickers.json в формате ответа GetStickers маркета
+
+    Args:
+        file_name (str): имя создаваемого файла
+        sticker_ids (list): ID стикеров справочника
+    """
+    stickers = [
+        {'id': sticker_id, 'name': f'Sticker | Team {number // 4} ({("Holo", "Foil", "Gold", "Glitter")[number % 4]}) | Event {number % 30}'}
+        for number, sticker_id in enumerate(sticker_ids)
+    ]
+    with open(file_name, 'w', encoding='utf-8') as file:
+        json.dump({'stickers': stickers}, file, ensure_ascii=False)
+
+def generate_market_items_file(file_name: str, rows: int, seed: int = 0, sticker_ids: list = None):
+    """Генерирует синтетический csv-файл базы данных в формате маркета
+
+    Args:
+        file_name (str): имя создаваемого файла
+        rows (int): кол-во предметов в файле
+        seed (int): зерно генератора случайных чисел, чтобы файлы были одинаковыми между запусками
+        sticker_ids (list, optional): ID стикеров справочника; если не переданы, ID стикеров на предметах случайные
+    """
+    rnd = random.Random(seed)
+    qualities = ['Factory New', 'Minimal Wear', 'Field-Tested', 'Well-Worn', 'Battle-Scarred']
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write(CSV_HEADERS + '\n')
+        for i in range(rows):
+            # у большинства предметов стикеров нет, у остальных от 1 до 5
+            stickers_count = rnd.choice((0, 0, 0, 1, 2, 3, 4, 5))
+            if sticker_ids is None:
+                item_stickers = ''.join(f'{rnd.randrange(10**9, 10**10)}|' for _ in range(stickers_count))
+            else:
+                item_stickers = ''.join(f'{rnd.choice(sticker_ids)}|' for _ in range(stickers_count))
+            quality = rnd.choice(qualities)
+            file.write(
+                f'{rnd.randrange(10**8, 10**10)};{rnd.randrange(10**9)};{rnd.randrange(100, 10**7)};{rnd.randrange(1, 50)};'
+                f'{rnd.randrange(1000)};Classified;{quality};0;0;{item_stickers};AK-47 | Redline {i} ({quality});'
+                f'AK-47 | Redline {i} ({quality});AK-47 | Redline ({quality})\n'
+            )
+
+def get_market_items_legacy(file_name: str):
+    """Прежний способ чтения базы данных: весь файл в список словарей, строка разбивается на каждое поле заново
+
+    Args:
+        file_name (str): имя csv-файла базы данных
+
+    Returns:
+        market_items (list): список словарей с информацией о предмете
+    """
+    market_items = []
+    with open(file_name, encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader)
+        for row in reader:
+            item_data = {}
+            item_data['c_classid'] = row[0].split(';')[0]
+            item_data['c_instanceid'] = row[0].split(';')[1]
+            item_data['price'] = row[0].split(';')[2]
+            item_data['amount'] = row[0].split(';')[3]
+            item_data['quality'] = row[0].split(';')[6]
+            item_data['sticker_ids'] = row[0].split(';')[9]
+            item_data['name'] = row[0].split(';')[10]
+            try:
+                item_data['hash_name'] = row[0].split(';')[12]
+            except IndexError:
+                item_data['hash_name'] = ''
+            item_data['url'] = f"https://market.csgo.com/item/{item_data['c_classid']}-{item_data['c_instanceid']}"
+            market_items.append(item_data)
+    return market_items
+
+def measure(func, *args, repeat: int = 1):
+    """Замеряет время выполнения и пиковое потребление памяти функции
+
+    Время и память замеряются в разных запусках, т.к. tracemalloc сильно замедляет выполнение.
+    Из repeat запусков берется лучшее время: оно меньше всего зависит от посторонней нагрузки
+
+    Returns:
+        tuple: (результат функции, время в секундах, пик памяти в байтах)
+    """
+    elapsed = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        run_elapsed = time.perf_counter() - start
+        elapsed = run_elapsed if elapsed is None else min(elapsed, run_elapsed)
+        del result # освобождаем память перед следующим запуском
+
+    tracemalloc.start()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def generate_rules(catalogue, count: int, seed: int = 0):
+    """Генерирует правила поиска в формате rules.json: наборы стикеров, цена и качество
+
+    Args:
+        catalogue (sticker_catalogue.StickerCatalogue): справочник стикеров
+        count (int): кол-во правил
+
+    Returns:
+        list: правила в виде словарей, см. rules.load_rules
+    """
+    rnd = random.Random(seed)
+    sticker_names = list(catalogue.name_to_ids)
+    qualities = ['Factory New', 'Minimal Wear', 'Field-Tested', 'Well-Worn', 'Battle-Scarred']
+    generated_rules = []
+    for number in range(count):
+        rule = {'name': f'Правило {number}', 'stickers': rnd.sample(sticker_names, rnd.randrange(1, 20))}
+        rule['min_stickers'] = rnd.choice((1, 1, 2, 3))
+        if rnd.random() < 0.5:
+            rule['max_price'] = rnd.randrange(100, 50_000)
+        if rnd.random() < 0.3:
+            rule['qualities'] = rnd.sample(qualities, 2)
+        generated_rules.append(rule)
+    return generated_rules
+
+def change_market_snapshot(market_snapshot: dict, share: float, seed: int = 0):
+    """Имитирует следующий снимок базы данных: часть предметов продана, часть сменила цену
+
+    Args:
+        market_snapshot (dict): снимок вида {ключ предмета: предмет}
+        share (float): доля проданных предметов и, отдельно, доля предметов с новой ценой
+
+    Returns:
+        dict: новый снимок
+    """
+    rnd = random.Random(seed)
+    changed_snapshot = dict(market_snapshot)
+    keys = rnd.sample(list(market_snapshot), int(len(market_snapshot) * share * 2))
+    for key in keys[:len(keys) // 2]:
+        del changed_snapshot[key]
+    for key in keys[len(keys) // 2:]:
+        changed_snapshot[key] = changed_snapshot[key]._replace(price=changed_snapshot[key].price - 1)
+    return changed_snapshot
+
+def render_found_items(found_items: list):
+    """Формирует вывод найденных предметов в памяти, без затрат на сам вывод в консоль
+
+    Returns:
+        int: кол-во символов вывода
+    """
+    output = io.StringIO()
+    for item in found_items:
+        bot.print_item_info(item, file=output)
+    return len(output.getvalue())
+
+def run_cases(rows: int, args):
+    """Генерирует базу данных из rows предметов и замеряет на ней все этапы цикла бота
+
+    Файлы создаются во временном каталоге, который на время замеров становится текущим: функции бота
+    читают market_items.csv и stickers.json из текущего каталога
+
+    Returns:
+        list: результаты замеров, по словарю на каждый случай
+    """
+    sticker_ids = generate_sticker_ids(args.stickers)
+    generate_stickers_file('stickers.json', sticker_ids)
+    generate_market_items_file('market_items.csv', rows, sticker_ids=sticker_ids)
+    bot._sticker_catalogues.clear() # справочник перечитается из синтетического stickers.json
+    catalogue = bot.get_sticker_catalogue()
+
+    market_items = bot.get_market_items()
+    market_snapshot = snapshot_diff.index_market_items(market_items)
+    next_snapshot = change_market_snapshot(market_snapshot, args.change_share)
+    first_diff = snapshot_diff.diff_snapshots({}, market_snapshot) # первый цикл: все предметы новые
+    next_diff = snapshot_diff.diff_snapshots(market_snapshot, next_snapshot)
+    rule_engine = rules.RuleEngine.from_rules(generate_rules(catalogue, args.rules), catalogue)
+    _, found_items, _ = bot.search_market_items_by_stickers(first_diff, rule_engine, {})
+    searched_items, found_items = found_items, found_items[:args.render_limit]
+    searched_items = {item.key: item for item in searched_items} # найденные к началу следующего цикла
+    user_stickers_names = [sticker['name'] for sticker in bot.get_stickers()[:args.user_stickers]]
+    user_stickers_names[::2] = [name.upper() for name in user_stickers_names[::2]] # половина - с поиском по нормализованному названию
+
+    # (название, кол-во обработанных элементов, функция)
+    cases = [
+        ('parse: legacy (list of dict)', rows, lambda: get_market_items_legacy('market_items.csv')),
+        ('parse: get_market_items', rows, bot.get_market_items),
+        ('parse: itemdb (stream, count)', rows, lambda: sum(1 for _ in itemdb.iter_market_items('market_items.csv'))),
+        ('diff: diff_snapshots', rows, lambda: snapshot_diff.diff_snapshots(market_snapshot, next_snapshot)),
+        ('stickers: get_user_stickers_ids', len(user_stickers_names), lambda: bot.get_user_stickers_ids(user_stickers_names)),
+        ('match: first cycle', len(first_diff.changed), lambda: bot.search_market_items_by_stickers(first_diff, rule_engine, {})),
+        # поиск меняет найденные предметы на месте, поэтому каждый запуск получает свою копию и делает ту же работу
+        ('match: next cycle', len(next_diff.changed), lambda: bot.search_market_items_by_stickers(next_diff, rule_engine, dict(searched_items))),
+        ('render: print_item_info', len(found_items), lambda: render_found_items(found_items)),
+    ]
+    results = []
+    for case_name, items_count, case in cases:
+        _, elapsed, peak = measure(case, repeat=args.repeat)
+        results.append({
+            'case': case_name,
+            'rows': rows,
+            'items': items_count,
+            'seconds': elapsed,
+            'peak_bytes': peak,
+            'items_per_second': items_count / elapsed if elapsed else None,
+        })
+    return results
+
+def print_results(results: list, previous_results: list = None):
+    """Выводит результаты замеров таблицей; если переданы прошлые результаты, то и изменение времени
+    """
+    previous = {(result['case'], result['rows']): result for result in previous_results or []}
+    for result in results:
+        line = (
+            f"{result['case']:34} {result['rows']:>9} {result['items']:>9} {result['seconds']:8.3f} s "
+            f"{result['peak_bytes'] / 2**20:8.1f} MiB {result['items_per_second'] or 0:12.0f} items/s"
+        )
+        previous_result = previous.get((result['case'], result['rows']))
+        if previous_result is not None and result['seconds']:
+            line += f" {previous_result['seconds'] / result['seconds']:6.2f}x"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер скорости разбора базы данных и поиска предметов на синтетических данных')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000],
+                        help='кол-во предметов в синтетической базе данных, можно несколько (например, 10000 100000 1000000)')
+    parser.add_argument('--stickers', type=int, default=5000, help='кол-во стикеров в синтетическом справочнике')
+    parser.add_argument('--rules', type=int, default=50, help='кол-во правил поиска')
+    parser.add_argument('--user-stickers', type=int, default=200, help='кол-во названий стикеров для get_user_stickers_ids')
+    parser.add_argument('--change-share', type=float, default=0.02, help='доля проданных предметов и предметов с новой ценой между снимками')
+    parser.add_argument('--render-limit', type=int, default=10_000, help='сколько найденных предметов выводить при замере вывода')
+    parser.add_argument('--repeat', type=int, default=3, help='сколько раз запускать каждый случай (берется лучшее время)')
+    parser.add_argument('--output', help='json-файл для результатов, по умолчанию benchmark_results/<дата и время>.json')
+    parser.add_argument('--compare', help='json-файл прошлого запуска, с которым сравнить время')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join('benchmark_results', time.strftime('%Y%m%d-%H%M%S') + '.json'))
+    previous_results = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            previous_results = json.load(file)['results']
+
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            for rows in args.rows:
+                results.extend(run_cases(rows, args))
+        finally:
+            os.chdir(cwd)
+    print_results(results, previous_results)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+            'results': results,
+        }, file, indent=4, ensure_ascii=False)
+    print(f'Результаты сохранены в {output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import json
+import os
+import itemdb
+
+try:
+    import numpy as np
+except ImportError: # numpy нужен только для колоночного режима, без него бот работает как обычно
+    np = None
+
+
+# колонки снимка, которые сохраняются в .npy-файлы
+COLUMNS = (
+    'classid', 'instanceid', 'price', 'amount', 'quality_codes',
+    'sticker_offsets', 'sticker_values', 'name_offsets', 'name_bytes', 'hash_name_offsets', 'hash_name_bytes',
+)
+
+def require_numpy():
+    if np is None:
+        raise ImportError('Для колоночного режима нужен numpy: выполните команду "pip install numpy"')
+
+
+def pack_strings(strings: list):
+    """Упаковывает строки в пару массивов: смещения и байты UTF-8 всех строк подряд
+
+    Такой формат, в отличие от массива python-строк, можно сохранить в .npy и открыть через mmap
+
+    Returns:
+        tuple: (смещения длиной len(strings) + 1, байты)
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+class ColumnarSnapshot:
+    """Снимок базы данных маркета в виде колонок numpy
+
+    Числовые поля хранятся в массивах int64, качество - кодами категорий, стикеры - в формате CSR:
+    стикеры i-го предмета - sticker_values[sticker_offsets[i]:sticker_offsets[i + 1]].
+    Фильтры по цене, качеству и стикерам - векторные маски без циклов на python
+    """
+
+    def __init__(self, columns: dict, quality_labels: list, db_name: str = None):
+        require_numpy()
+        for column in COLUMNS:
+            setattr(self, column, columns[column])
+        self.quality_labels = quality_labels # код качества -> название
+        self.db_name = db_name # имя файла базы данных маркета, из которого построен снимок
+
+    def __len__(self):
+        return len(self.classid)
+
+    @classmethod
+    def from_items(cls, market_items, db_name: str = None):
+        """Строит колоночный снимок из предметов маркета
+
+        Args:
+            market_items (iterable): предметы маркета (itemdb.MarketItem)
+            db_name (str, optional): имя файла базы данных маркета
+
+        Returns:
+            ColumnarSnapshot: колоночный снимок
+        """
+        require_numpy()
+        market_items = list(market_items)
+        quality_codes = {} # название качества -> код
+        sticker_counts = [len(item.sticker_ids) for item in market_items]
+        sticker_offsets = np.zeros(len(market_items) + 1, dtype=np.int64)
+        np.cumsum(sticker_counts, out=sticker_offsets[1:])
+        name_offsets, name_bytes = pack_strings([item.name for item in market_items])
+        hash_name_offsets, hash_name_bytes = pack_strings([item.hash_name for item in market_items])
+        columns = {
+            'classid': np.fromiter((item.classid for item in market_items), dtype=np.int64, count=len(market_items)),
+            'instanceid': np.fromiter((item.instanceid for item in market_items), dtype=np.int64, count=len(market_items)),
+            'price': np.fromiter((item.price for item in market_items), dtype=np.int64, count=len(market_items)),
+            'amount': np.fromiter((item.amount for item in market_items), dtype=np.int64, count=len(market_items)),
+            'quality_codes': np.fromiter(
+                (quality_codes.setdefault(item.quality, len(quality_codes)) for item in market_items),
+                dtype=np.int32, count=len(market_items)
+            ),
+            'sticker_offsets': sticker_offsets,
+            'sticker_values': np.fromiter(
+                (int(sticker_id) for item in market_items for sticker_id in item.sticker_ids),
+                dtype=np.int64, count=int(sticker_offsets[-1])
+            ),
+            'name_offsets': name_offsets,
+            'name_bytes': name_bytes,
+            'hash_name_offsets': hash_name_offsets,
+            'hash_name_bytes': hash_name_bytes,
+        }
+        return cls(columns, list(quality_codes), db_name)
+
+    @classmethod
+    def from_csv(cls, file_name: str = 'market_items.csv', db_name: str = None):
+        """Читает csv-файл базы данных сразу в колоночный снимок
+        """
+        return cls.from_items(itemdb.iter_market_items(file_name), db_name)
+
+    def save(self, directory: str):
+        """Сохраняет снимок в каталог: каждая колонка - отдельный .npy-файл
+
+        Args:
+            directory (str): каталог для файлов снимка
+        """
+        os.makedirs(directory, exist_ok=True)
+        meta_file_name = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_file_name): # пока колонки перезаписываются, старый снимок считается недействительным
+            os.remove(meta_file_name)
+        for column in COLUMNS:
+            np.save(os.path.join(directory, f'{column}.npy'), getattr(self, column))
+        # метаданные пишем последними: без них неполный снимок не загрузится
+        with open(meta_file_name, 'w', encoding='utf-8') as f:
+            json.dump({'quality_labels': self.quality_labels, 'db_name': self.db_name}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """Загружает сохраненный снимок; с mmap файлы не читаются целиком, а отображаются в память
+
+        Отображенные в память массивы доступны только для чтения и могут разделяться между процессами
+
+        Args:
+            directory (str): каталог с файлами снимка
+            mmap (bool): отображать ли файлы в память вместо чтения
+
+        Returns:
+            ColumnarSnapshot or None: снимок или None, если сохраненного снимка нет
+        """
+        require_numpy()
+        meta_file_name = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_file_name):
+            return None
+        with open(meta_file_name, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        columns = {
+            column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r' if mmap else None)
+            for column in COLUMNS
+        }
+        return cls(columns, meta['quality_labels'], meta['db_name'])
+
+    def price_mask(self, min_price: int = None, max_price: int = None):
+        """Маска предметов с ценой в диапазоне [min_price, max_price] (в копейках)
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+        return mask
+
+    def quality_mask(self, qualities: list):
+        """Маска предметов с одним из переданных качеств
+        """
+        codes = [code for code, label in enumerate(self.quality_labels) if label in qualities]
+        return np.isin(self.quality_codes, codes)
+
+    def sticker_counts(self, sticker_ids: list = None):
+        """Возвращает для каждого предмета кол-во стикеров из переданных (или всех стикеров, если ничего не передано)
+        """
+        if sticker_ids is None:
+            return np.diff(self.sticker_offsets)
+        hits = np.isin(self.sticker_values, np.array([int(sticker_id) for sticker_id in sticker_ids], dtype=np.int64))
+        hits_cumsum = np.zeros(len(hits) + 1, dtype=np.int64)
+        np.cumsum(hits, out=hits_cumsum[1:])
+        # кол-во совпадений внутри строки CSR = разность накопленных сумм на ее границах
+        return hits_cumsum[self.sticker_offsets[1:]] - hits_cumsum[self.sticker_offsets[:-1]]
+
+    def sticker_mask(self, sticker_ids: list, min_stickers: int = 1):
+        """Маска предметов, на которых хотя бы min_stickers стикеров из переданных
+        """
+        return self.sticker_counts(sticker_ids) >= min_stickers
+
+    def get_string(self, offsets, data, index: int):
+        return bytes(data[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def get_item(self, index: int):
+        """Собирает предмет маркета из колонок
+
+        Args:
+            index (int): номер предмета в снимке
+
+        Returns:
+            itemdb.MarketItem: предмет маркета
+        """
+        sticker_values = self.sticker_values[self.sticker_offsets[index]:self.sticker_offsets[index + 1]]
+        return itemdb.MarketItem(
+            int(self.classid[index]),
+            int(self.instanceid[index]),
+            int(self.price[index]),
+            int(self.amount[index]),
+            self.quality_labels[self.quality_codes[index]],
+            tuple(str(sticker_id) for sticker_id in sticker_values.tolist()),
+            self.get_string(self.name_offsets, self.name_bytes, index),
+            self.get_string(self.hash_name_offsets, self.hash_name_bytes, index),
+        )
+
+    def iter_items(self, mask=None):
+        """Отдает предметы снимка (или только отмеченные маской)
+
+        Колонки переводятся в списки python разом, а не поэлементно, поэтому сборка всего снимка занимает доли секунды
+
+        Args:
+            mask (numpy.ndarray, optional): булева маска предметов
+
+        Yields:
+            itemdb.MarketItem: предмет маркета
+        """
+        indexes = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        sticker_offsets = self.sticker_offsets.tolist()
+        sticker_values = [str(sticker_id) for sticker_id in self.sticker_values.tolist()]
+        name_offsets, name_bytes = self.name_offsets.tolist(), self.name_bytes.tobytes()
+        hash_name_offsets, hash_name_bytes = self.hash_name_offsets.tolist(), self.hash_name_bytes.tobytes()
+        columns = zip(
+            indexes.tolist(),
+            self.classid[indexes].tolist(),
+            self.instanceid[indexes].tolist(),
+            self.price[indexes].tolist(),
+            self.amount[indexes].tolist(),
+            self.quality_codes[indexes].tolist(),
+        )
+        for index, classid, instanceid, price, amount, quality_code in columns:
+            yield itemdb.MarketItem(
+                classid,
+                instanceid,
+                price,
+                amount,
+                self.quality_labels[quality_code],
+                tuple(sticker_values[sticker_offsets[index]:sticker_offsets[index + 1]]),
+                name_bytes[name_offsets[index]:name_offsets[index + 1]].decode('utf-8'),
+                hash_name_bytes[hash_name_offsets[index]:hash_name_offsets[index + 1]].decode('utf-8'),
+            )
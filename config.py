@@ -1,3 +1,62 @@
 USERNAME = 'USERNAME'
 PASSWORD = 'PASSWORD'
-TWOFACTOR_CODE = '2FC'
\ No newline at end of file
+TWOFACTOR_CODE = '2FC'
+
+# настройки http-запросов к маркету
+REQUEST_TIMEOUT = (5, 60) # таймауты (на подключение, на чтение ответа) в секундах
+REQUEST_RETRIES = 3 # сколько раз повторять запрос при обрыве соединения или ответах 429/5xx
+REQUEST_BACKOFF_FACTOR = 1 # множитель паузы между повторами: 1, 2, 4... секунд
+REQUEST_POOL_SIZE = 10 # кол-во соединений, которые держатся открытыми для повторного использования
+RELOGIN_MIN_INTERVAL = 300 # не чаще, чем раз в столько секунд, заново входить в аккаунт при ошибках авторизации
+
+# настройки получения float найденных предметов
+FLOAT_ENABLED = False # выводить ли float найденных предметов (отдельным уведомлением после самого предмета)
+FLOAT_REQUESTS_PER_SECOND = 2 # не больше стольких запросов float в секунду во избежание бана
+FLOAT_BURST = 4 # сколько запросов можно отправить разом после простоя
+FLOAT_WORKERS = 4 # кол-во потоков, параллельно запрашивающих float
+
+# колоночный режим: снимок базы данных дополнительно хранится в массивах numpy (нужен "pip install numpy")
+USE_COLUMNAR = False # сохранять ли снимок в колоночном виде; при перезапуске бот продолжит с последнего снимка
+COLUMNAR_CACHE_DIR = 'snapshot_cache' # каталог для .npy-файлов последнего снимка
+
+# расписание опроса базы данных маркета
+POLL_DEFAULT_PERIOD = 60 # период обновления базы данных маркета, пока бот не оценил его сам
+POLL_LEAD = 5 # за сколько секунд до ожидаемого нового снимка начинать частый опрос
+POLL_FAST_INTERVAL = 2 # пауза между опросами рядом с ожидаемым снимком
+POLL_SLOW_INTERVAL = 15 # пауза между опросами, если снимок сильно запаздывает
+POLL_ERROR_BACKOFF = 5 # пауза после первой ошибки, дальше удваивается
+POLL_MAX_BACKOFF = 300 # максимальная пауза после ошибок
+
+# конвейер: скачивание, разбор, поиск и вывод работают одновременно в отдельных потоках
+PIPELINE_QUEUE_SIZE = 1 # сколько снимков может ждать своей очереди между этапами
+PIPELINE_LOG_TIMINGS = True # выводить ли время этапов после каждого снимка
+
+# метрики и профилирование
+METRICS_HOST = '127.0.0.1' # метрики доступны только с этого компьютера
+METRICS_PORT = 9108 # порт http-сервера метрик в формате Prometheus (http://127.0.0.1:9108/metrics), 0 - не запускать;
+# если порт занят (например, другим экземпляром бота), бот работает без сервера метрик - укажите каждому экземпляру свой порт
+METRICS_LOG_INTERVAL = 300 # раз во сколько секунд выводить метрики строкой json, 0 - не выводить
+PROFILE_ENABLED = False # профилировать ли этапы конвейера через cProfile
+PROFILE_DIR = 'profiles' # куда сохранять профили этапов (<этап>.prof) при остановке бота
+
+# уведомления о найденных предметах выводятся пачками в отдельном потоке
+NOTIFY_BUFFER_SIZE = 10000 # сколько уведомлений может ждать вывода, остальные пропускаются (но сохраняются в market.db)
+NOTIFY_BATCH_SIZE = 100 # максимальный размер пачки уведомлений
+NOTIFY_FLOAT_LIMIT = 20 # сколько запросов float может выполняться одновременно, остальные ждут в очереди
+NOTIFY_JSONL_FILE = None # файл JSON Lines для всех найденных предметов (например, 'hits.jsonl'), None - не писать
+NOTIFY_WEBHOOK_URL = None # url, на который найденные предметы отправляются POST-запросом в json, None - не отправлять
+
+# журнал найденных предметов (таблица hits в market.db) и история изменений предметов и цен
+HITS_RETENTION_DAYS = 30 # сколько дней хранить записи о проданных найденных предметах, 0 - хранить всегда
+HITS_COMPACT_EVERY = 1000 # раз во сколько снимков удалять устаревшие записи (журнала и истории)
+HISTORY_RETENTION_DAYS = 30 # сколько дней хранить историю изменений предметов и цен, 0 - хранить всегда
+
+# ленты: площадки и игры, базы данных которых бот скачивает и разбирает параллельно
+# первая лента - основная, ее файлы называются как раньше (market_items.csv, stickers.json, snapshot_cache),
+# у остальных к имени файла добавляется имя ленты (market_items_dota2.csv);
+# floats - есть ли у площадки сервер float (/float/<classid>/<instanceid>), у остальных лент float не запрашивается
+FEEDS = [
+    {'name': 'csgo', 'host': 'https://market.csgo.com', 'app_id': 730, 'stickers': True, 'floats': True},
+    # {'name': 'dota2', 'host': 'https://market.dota2.net', 'app_id': 570, 'stickers': False, 'floats': False},
+]
+PARSE_IN_PROCESSES = None # разбирать ли базы данных лент в отдельных процессах (по процессу на ленту), None - только если лент несколько
@@ -0,0 +1,40 @@
+import signal
+import itemdb
+import snapshot_diff
+import columnar
+
+
+# имя ленты -> последний снимок ленты; хранится в процессе, который разбирает ленту
+_feed_snapshots = {}
+
+def ignore_interrupts():
+    """Инициализатор процесса ленты: Ctrl+C в консоли получают все процессы бота, а останавливать конвейеры должен
+    главный процесс - иначе процесс ленты падает посреди разбора и снимок, который этапы дорабатывают при остановке, теряется
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def diff_market_items_file(feed_name: str, file_name: str, previous_snapshot: dict = None,
+                           db_name: str = None, columnar_cache_dir: str = None):
+    """Разбирает csv-файл базы данных ленты и сравнивает его с прошлым снимком ленты
+
+    Выполняется в отдельном процессе, у каждой ленты свой процесс. Прошлый снимок остается в процессе,
+    а обратно передаются только изменения: передача всего снимка между процессами дороже самого разбора
+
+    Args:
+        feed_name (str): имя ленты
+        file_name (str): csv-файл базы данных
+        previous_snapshot (dict, optional): начальный прошлый снимок, передается только при первом вызове
+        db_name (str, optional): имя файла базы данных маркета
+        columnar_cache_dir (str, optional): если передан, то снимок сохраняется сюда в колоночном виде
+
+    Returns:
+        tuple: (изменения с прошлого снимка, кол-во предметов в снимке)
+    """
+    if previous_snapshot is not None:
+        _feed_snapshots[feed_name] = previous_snapshot
+    current_snapshot = snapshot_diff.index_market_items(itemdb.iter_market_items(file_name))
+    market_diff = snapshot_diff.diff_snapshots(_feed_snapshots.get(feed_name, {}), current_snapshot)
+    _feed_snapshots[feed_name] = current_snapshot
+    if columnar_cache_dir is not None:
+        columnar.ColumnarSnapshot.from_items(current_snapshot.values(), db_name).save(columnar_cache_dir)
+    return market_diff, len(current_snapshot)
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+import query
+from metrics import metrics
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов по алгоритму token bucket
+
+    Корзина пополняется со скоростью rate токенов в секунду и вмещает не больше capacity токенов,
+    каждый запрос забирает один токен, а если токенов нет - ждет, пока он появится
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Забирает токен, при необходимости ожидая его появления
+
+        Returns:
+            float: сколько секунд пришлось ждать
+        """
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate # через сколько появится следующий токен
+            time.sleep(delay)
+            waited += delay
+
+
+class FloatCache:
+    """Постоянный кэш значений float по ClassID и InstanceID предмета
+
+    Float предмета никогда не меняется, поэтому однажды полученное значение хранится без срока годности.
+    Кэш - файл JSON Lines, в который только дописываются новые значения: запись стоит O(1), а не O(размера кэша),
+    и при падении посреди записи теряется не больше одной последней строки
+    """
+
+    def __init__(self, file_name: str = 'floats.jsonl', legacy_file_name: str = 'floats.json'):
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.floats = {}
+        if os.path.exists(file_name):
+            self.load()
+        elif os.path.exists(legacy_file_name) and os.path.getsize(legacy_file_name):
+            # кэш прошлых версий бота - один json-файл, переносим его в новый формат
+            with open(legacy_file_name, 'r', encoding='utf-8') as f:
+                for key, item_float in json.load(f).items():
+                    self.append(key, item_float)
+
+    def load(self):
+        line = ''
+        with open(self.file_name, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError: # недописанная строка после падения
+                    continue
+                self.floats[entry['key']] = entry['float']
+        if line and not line.endswith('\n'): # новые строки не должны склеиться с недописанной
+            with open(self.file_name, 'a', encoding='utf-8') as f:
+                f.write('\n')
+
+    @staticmethod
+    def get_key(classid, instanceid):
+        return f'{classid}_{instanceid}'
+
+    def get(self, classid, instanceid):
+        with self.lock:
+            return self.floats.get(self.get_key(classid, instanceid))
+
+    def set(self, classid, instanceid, item_float: dict):
+        key = self.get_key(classid, instanceid)
+        with self.lock:
+            if key not in self.floats:
+                self.append(key, item_float)
+
+    def append(self, key: str, item_float: dict):
+        """Запоминает значение и сразу дописывает его в файл
+        """
+        self.floats[key] = item_float
+        with open(self.file_name, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'key': key, 'float': item_float}, ensure_ascii=False) + '\n')
+
+
+def get_item_float(classid: str, instanceid: str, host: str = 'https://market.csgo.com'):
+    """Получает значения Float предмета: Float Value (потертость), Seed, Index
+
+    Args:
+        classid (str): ClassID предмета в Steam
+        instanceid (str): InstanceID предмета в Steam
+        host (str): площадка, на которой выставлен предмет
+
+    Returns:
+        item_float (dict): информация float: непосредственно значение float, seed и index
+    """
+    url = f'{host}/float/{classid}/{instanceid}'
+    content = query.get_content(url, flag='json')
+    if content['status']:
+        item_float = {
+            'float_value': content['paintwear'],
+            'seed': content['paintseed'],
+            'index': content['paintindex']
+        }
+    else:
+        item_float = {}
+    return item_float
+
+
+class FloatEnricher:
+    """Параллельно получает float для найденных предметов с ограничением частоты запросов и кэшем
+    """
+
+    def __init__(self, rate: float = config.FLOAT_REQUESTS_PER_SECOND, burst: int = config.FLOAT_BURST,
+                 workers: int = config.FLOAT_WORKERS, cache: FloatCache = None):
+        self.bucket = TokenBucket(rate, burst)
+        self.cache = cache if cache is not None else FloatCache()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='float')
+
+    def fetch_float(self, item, host: str = 'https://market.csgo.com'):
+        """Получает float предмета с сервера с соблюдением лимита запросов; удачные ответы кэширует
+
+        Args:
+            item (itemdb.MarketItem): предмет маркета
+            host (str): площадка, на которой выставлен предмет
+
+        Returns:
+            dict: информация float, пустой словарь, если получить не удалось
+        """
+        waited = self.bucket.acquire()
+        if waited:
+            metrics.inc('rate_limit_sleeps_total')
+            metrics.inc('rate_limit_sleep_seconds_total', waited)
+        try:
+            item_float = get_item_float(item.classid, item.instanceid, host)
+        except Exception as e: # сервер float часто отвечает ошибками, из-за этого не стоит прерывать работу бота
+            print(f'Не удалось получить float предмета {item.name}: {e}')
+            return {}
+        if item_float:
+            self.cache.set(item.classid, item.instanceid, item_float)
+        return item_float
+
+    def get_cached_float(self, item):
+        """Возвращает float предмета из кэша, не обращаясь к серверу
+
+        Args:
+            item (itemdb.MarketItem): предмет маркета
+
+        Returns:
+            dict or None: информация float или None, если предмета нет в кэше
+        """
+        item_float = self.cache.get(item.classid, item.instanceid)
+        if item_float is not None:
+            metrics.inc('float_cache_hits_total') # повторно выставленный предмет не стоит ни одного запроса
+        return item_float
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,111 @@
+from typing import Callable, Iterator, NamedTuple, Optional
+
+
+class MarketItem(NamedTuple):
+    """Предмет на продаже из базы данных маркета (одна строка csv-файла)
+    """
+    classid: int # ClassID предмета в Steam
+    instanceid: int # InstanceID предмета в Steam
+    price: int # цена предмета в копейках
+    amount: int # кол-во доступных предметов
+    quality: str # качество предмета
+    sticker_ids: tuple # ID стикеров для поиска названий стикеров на предмете по их ID
+    name: str # название предмета
+    hash_name: str # hash название предмета, некоторые методы api его требуют
+
+    @property
+    def key(self):
+        """Ключ, по которому предметы отличаются друг от друга на площадке: (ClassID, InstanceID)
+        """
+        return self.classid, self.instanceid
+
+    @property
+    def url(self):
+        """Ссылка на предмет, строится только по требованию
+        """
+        return self.get_url()
+
+    def get_url(self, host: str = 'https://market.csgo.com'):
+        """Ссылка на предмет на площадке host (у каждой ленты своя площадка)
+        """
+        return f'{host}/item/{self.classid}-{self.instanceid}'
+
+    def to_dict(self):
+        """Возвращает предмет в виде словаря, пригодного для сохранения в json
+
+        Returns:
+            dict: информация о предмете вместе со ссылкой на него
+        """
+        item_data = self._asdict()
+        item_data['sticker_ids'] = list(self.sticker_ids)
+        item_data['url'] = self.url
+        return item_data
+
+
+def parse_market_item(line: str):
+    """Разбирает строку csv-файла базы данных в предмет
+
+    Строка разбивается по ';' ровно один раз, из полей берутся только нужные боту
+
+    Args:
+        line (str): строка вида c_classid;c_instanceid;c_price;c_offers;c_popularity...
+
+    Returns:
+        MarketItem: предмет маркета
+    """
+    fields = line.rstrip('\r\n').split(';')
+    return MarketItem(
+        int(fields[0]),
+        int(fields[1]),
+        int(fields[2]),
+        int(fields[3]),
+        fields[6],
+        # строка вида 9272819286|9144421154|5227247238| -> пустые ID отбрасываем
+        tuple(sticker_id for sticker_id in fields[9].split('|') if sticker_id),
+        fields[10],
+        fields[12] if len(fields) > 12 else '', # не все предметы имеют hash name
+    )
+
+
+def iter_market_items(file_name: str = 'market_items.csv',
+                      predicate: Optional[Callable[[MarketItem], bool]] = None,
+                      limit: Optional[int] = None) -> Iterator[MarketItem]:
+    """Построчно читает csv-файл базы данных и отдает предметы по одному
+
+    Весь файл в память не загружается, поэтому чтение можно остановить в любой момент
+    или сразу отфильтровать ненужные предметы
+
+    Args:
+        file_name (str): имя csv-файла базы данных
+        predicate (callable, optional): функция-фильтр, в выдачу попадают только предметы, для которых она вернула True
+        limit (int, optional): максимальное кол-во отдаваемых предметов
+
+    Yields:
+        MarketItem: предмет маркета
+    """
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    with open(file_name, encoding='utf-8') as file:
+        next(file, None) # первая строка csv таблицы - заголовки c_classid;c_instanceid;c_price;c_offers;c_popularity...
+        for line in file:
+            if not line.strip(): # пустые строки (например, в конце файла) пропускаем
+                continue
+            item = parse_market_item(line)
+            if predicate is not None and not predicate(item):
+                continue
+            yield item
+            count += 1
+            if count == limit:
+                return
+
+
+def read_market_items(file_name: str = 'market_items.csv'):
+    """Считывает все предметы csv-файла базы данных в список
+
+    Функция верхнего уровня, поэтому ее можно выполнять в отдельном процессе (ProcessPoolExecutor)
+
+    Returns:
+        list: предметы маркета
+    """
+    return list(iter_market_items(file_name))
@@ -1,7 +1,10 @@
 from selenium import webdriver
+import os
+import requests
 import time
 import config
 import json
+import query
 
 
 def login_to_steam():
@@ -67,6 +70,7 @@ def login_to_steam():
     # получаем и сохраням куки
     cookies = driver.get_cookies()
     save_cookies_to_file(cookies)
+    query.reload_cookies() # подставляем свежие куки в сессию бота
 
     # завершаем работу драйвера
     driver.close() # закрывает только одну вкладку
@@ -74,6 +78,39 @@ def login_to_steam():
 
     return True # если не был возвращен False, то продолжаем работу бота
 
+def is_session_valid():
+    """Проверяет одним запросом, действительны ли сохраненные в cookies.json куки
+
+    Неавторизованному пользователю маркет показывает кнопку входа через Steam, авторизованному - нет
+
+    Returns:
+        bool: True, если сессия действительна и входить в аккаунт заново не нужно
+    """
+    if not load_cookies():
+        return False
+    try:
+        # одиночный запрос с cookies сессии, но без ее адаптера с повторами и в обход query.send_request:
+        # при недоступном маркете проверка не растягивается на несколько повторов, а ошибка авторизации не запускает повторный вход
+        response = requests.get(
+            'https://market.csgo.com/docs', headers={**query.HEADERS, **query.HTML_HEADERS},
+            cookies=query.get_session().cookies, timeout=config.REQUEST_TIMEOUT
+        )
+    except Exception as e:
+        print(f'Не удалось проверить сессию: {e}')
+        return False
+    return response.status_code == 200 and 'btn-signin' not in response.text
+
+def ensure_logged_in():
+    """Входит в аккаунт через браузер, только если сохраненная сессия истекла
+
+    Returns:
+        bool: статус выполнения функции. Если False - дальнейшая работа бота невозможна
+    """
+    if is_session_valid():
+        print('Сохраненная сессия действительна, вход в аккаунт не требуется')
+        return True
+    return login_to_steam()
+
 def save_cookies_to_file(cookies: list):
     """Сохраняем cookies в файл
 
@@ -84,6 +121,18 @@ def save_cookies_to_file(cookies: list):
     with open('cookies.json', 'w', encoding='utf-8') as f:
         json.dump(cookies, f, indent=4, ensure_ascii=False)
     
+def load_cookies():
+    """Считывает сохраненные cookies из файла
+
+    Returns:
+        cookies (list): список словарей, хранящих cookie сессии; пустой, если вход еще не выполнялся
+    """
+    if not os.path.exists('cookies.json') or not os.path.getsize('cookies.json'):
+        return []
+    with open('cookies.json', 'r', encoding='utf-8') as f:
+        cookies = json.load(f)
+    return cookies
+
 def get_cookies():
     """Возвращает куки в отформатированном виде
 
@@ -91,8 +140,7 @@ def get_cookies():
         cookies (str): строка с отформатированными cookies
     """
     # считываем куки из файла
-    with open('cookies.json', 'r', encoding='utf-8') as f:
-        cookies = json.load(f)
+    cookies = load_cookies()
 
     # приводим куки в нужный формат для их дальнейшей передачи в заголовках: _ym_uid=1642943714246294679; _ym_d=1642943714; и тд
     cookies = '; '.join([f"{cookie['name']}={cookie['value']}" for cookie in cookies])
@@ -1,80 +1,242 @@
-import csv
+import concurrent.futures
+import functools
 import os
 import time
 import login
 import api_key_generator
 import query
+import itemdb
+import snapshot_diff
+import floats
+import sticker_catalogue
+import storage
+import rules
+import columnar
+import scheduler
+import pipeline
+import notifications
+import feed_worker
+from metrics import metrics, start_metrics_server, start_metrics_logger
+import config
 import json
 
 
-def get_market_items_db(current_db_file_name: str):
-    """Возвращает базу данных всех вещей на продаже в фиксированный момент времени
+def get_feed(name: str = None):
+    """Возвращает ленту из config.FEEDS по имени
 
     Args:
-        current_db_file_name (str): имя файла базы данных, формат csv
+        name (str, optional): имя ленты, по умолчанию - основная (первая) лента
+
+    Returns:
+        dict: лента {'name', 'host', 'app_id', 'stickers', 'floats'}
+    """
+    if name is None:
+        return config.FEEDS[0]
+    for feed in config.FEEDS:
+        if feed['name'] == name:
+            return feed
+    raise ValueError(f"Лента '{name}' не найдена в config.FEEDS")
+
+def get_feed_path(feed: dict, path: str):
+    """Возвращает имя файла или каталога ленты: у основной ленты - как есть, у остальных - с именем ленты
+
+    Args:
+        feed (dict): лента
+        path (str): имя файла основной ленты, например market_items.csv
 
     Returns:
-        market_items_db (str): CSV-файл с данными в формате строки
+        str: имя файла ленты, например market_items_dota2.csv
+    """
+    if feed is config.FEEDS[0]:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{feed['name']}{ext}"
+
+def download_market_items_db(current_db_file_name: str, file_name: str = 'market_items.csv', feed: dict = None):
+    """Скачивает базу данных всех вещей на продаже в фиксированный момент времени в csv-файл
+
+    Файл скачивается по частям сразу на диск, поэтому потребление памяти не зависит от размера базы данных
+
+    Args:
+        current_db_file_name (str): имя файла базы данных, формат csv
+        file_name (str): куда сохранить базу данных
+        feed (dict, optional): лента, по умолчанию - основная
     """
-    db_file_url = f'https://market.csgo.com/itemdb/{current_db_file_name}' # url-адрес файла базы данных
-    market_items_db = query.get_content(db_file_url) # получаем базу данных вещей
-    return market_items_db 
+    feed = feed or get_feed()
+    db_file_url = f"{feed['host']}/itemdb/{current_db_file_name}" # url-адрес файла базы данных
+    query.download_to_file(db_file_url, file_name) # скачиваем базу данных вещей
 
-def get_current_db_file_name():
+def get_current_db_file_name(snapshot_state: dict = None):
     """Возвращает текущее имя файла базы данных
 
+    Если передано состояние последнего снимка, то запрос отправляется условным (ETag/Last-Modified),
+    и при ответе 304 Not Modified возвращается имя последнего скачанного файла. Валидаторы нового ответа
+    откладываются в snapshot_state['pending_validators'], а в состояние их переносит update_market_items
+    только после скачивания файла: иначе при неудачном скачивании следующие опросы получали бы 304
+    и новый снимок так и не был бы скачан
+
+    Args:
+        snapshot_state (dict, optional): состояние последнего снимка базы данных, см. get_initial_snapshot_state;
+            если не передано, то запрашивается имя файла основной ленты
+
     Returns:
         current_db_file_name (str): имя файла базы данных, формат csv
     """
-    url = 'https://market.csgo.com/itemdb/current_730.json' # адрес имени файла базы данных
-    current_db_file_name = query.get_content(url, flag='json')['db'] # получение имени БД
+    feed = snapshot_state['feed'] if snapshot_state is not None else get_feed()
+    url = f"{feed['host']}/itemdb/current_{feed['app_id']}.json" # адрес имени файла базы данных
+    if snapshot_state is None:
+        current_db_file_name = query.get_content(url, flag='json')['db'] # получение имени БД
+        return current_db_file_name
+
+    headers = {}
+    if snapshot_state['etag']:
+        headers['If-None-Match'] = snapshot_state['etag']
+    if snapshot_state['last_modified']:
+        headers['If-Modified-Since'] = snapshot_state['last_modified']
+    response = query.get_response(url, headers=headers)
+    if response.status_code == 304: # сервер подтвердил, что имя файла не поменялось
+        return snapshot_state['db']
+    response.raise_for_status()
+    # валидаторы, если сервер их присылает, запоминаются только после скачивания файла
+    snapshot_state['pending_validators'] = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    current_db_file_name = response.json()['db'] # получение имени БД
     return current_db_file_name
 
-def write_market_items_to_file(market_items_db: str):
-    """Сохраняет базу данных вещей на продаже в фиксированный момент времени в csv-файл
+def get_initial_snapshot_state(feed: dict = None):
+    """Возвращает начальное состояние последнего снимка базы данных
 
     Args:
-        market_items_db (str): CSV-файл с данными в формате строки
+        feed (dict, optional): лента, по умолчанию - основная
+
+    Returns:
+        dict: лента, имя последнего скачанного файла БД, валидаторы ответа current_<app_id>.json и счетчики циклов
     """
-    with open('market_items.csv', 'w', encoding='utf-8') as file:
-        file.write(market_items_db)
+    return {
+        'feed': feed or get_feed(), # лента, к которой относится снимок
+        'db': None, # имя последнего скачанного файла базы данных
+        'etag': None, # ETag ответа current_<app_id>.json
+        'last_modified': None, # Last-Modified ответа current_<app_id>.json
+        'pending_validators': None, # (ETag, Last-Modified) последнего ответа, пока его файл еще не скачан
+        'skipped_cycles': 0, # сколько циклов пропущено с момента запуска, т.к. база данных не менялась
+        'downloads': 0, # сколько снимков скачано с момента запуска
+    }
+
+def get_feed_label(feed: dict):
+    """Возвращает имя ленты для сообщений в консоль; если лента одна, то пустую строку
+    """
+    return f" ({feed['name']})" if len(config.FEEDS) > 1 else ''
 
-def update_market_items():
+def update_market_items(snapshot_state: dict, file_name: str = 'market_items.csv'):
     """Обновляет базу данных всех вещей на продаже в фиксированный момент времени
 
     Информация о предметах на главной странице сайте строится из предложений продавцов, 
     находящихся в данный момент онлайн на сайте. Она хранится в специальной базе данных и обновляется раз в минуту.
     Таким образом, сканировать главную или выполнять поиск по предметам чаще, чем раз в минуту, 
     не имеет смысла и создаёт избыточную нагрузку на наш сервер. (c) CSGO Market
+
+    Если имя файла базы данных не изменилось с прошлого цикла, то файл повторно не скачивается
+
+    Args:
+        snapshot_state (dict): состояние последнего снимка базы данных, см. get_initial_snapshot_state
+        file_name (str): куда сохранить базу данных
+
+    Returns:
+        bool: True, если был скачан новый снимок базы данных, иначе False
     """
-    current_db_file_name = get_current_db_file_name() # имя файла базы данных
-    market_items_db = get_market_items_db(current_db_file_name) # сама база данных вещей
-    write_market_items_to_file(market_items_db) # сохранение
-    # write_market_items_to_file(get_market_items_db(get_current_db_file_name()))
+    current_db_file_name = get_current_db_file_name(snapshot_state) # имя файла базы данных
+    if current_db_file_name == snapshot_state['db']:
+        commit_snapshot_validators(snapshot_state)
+        snapshot_state['skipped_cycles'] += 1
+        # опрос идет раз в несколько секунд, поэтому счетчик не выводится в консоль, а отдается метрикой
+        metrics.set('skipped_cycles', snapshot_state['skipped_cycles'], feed=snapshot_state['feed']['name'])
+        return False
+    download_market_items_db(current_db_file_name, file_name, snapshot_state['feed']) # скачиваем саму базу данных вещей
+    snapshot_state['db'] = current_db_file_name # запоминаем имя только после успешного сохранения
+    commit_snapshot_validators(snapshot_state) # и валидаторы, иначе при ошибке скачивания сервер ответил бы 304 на новый снимок
+    return True
+
+def commit_snapshot_validators(snapshot_state: dict):
+    """Переносит отложенные валидаторы ответа current_<app_id>.json в состояние снимка
+    """
+    if snapshot_state['pending_validators'] is not None:
+        snapshot_state['etag'], snapshot_state['last_modified'] = snapshot_state['pending_validators']
+        snapshot_state['pending_validators'] = None
+
+_sticker_catalogues = {} # имя ленты -> справочник стикеров, загружается из stickers.json один раз
 
-def update_stickers():
+def load_cached_market_snapshot(snapshot_state: dict):
+    """Загружает последний снимок бд, сохраненный в колоночном виде до перезапуска бота
+
+    Так после перезапуска бот не скачивает тот же снимок заново и не уведомляет повторно о предметах,
+    которые уже были на продаже до перезапуска
+
+    Args:
+        snapshot_state (dict): состояние последнего снимка базы данных, в него записывается имя загруженного снимка
+
+    Returns:
+        dict: снимок вида {ключ предмета: предмет}, пустой, если сохраненного снимка нет
+    """
+    cached_snapshot = columnar.ColumnarSnapshot.load(get_feed_path(snapshot_state['feed'], config.COLUMNAR_CACHE_DIR))
+    if cached_snapshot is None:
+        return {}
+    snapshot_state['db'] = cached_snapshot.db_name
+    return snapshot_diff.index_market_items(cached_snapshot.iter_items())
+
+def update_stickers(feed: dict = None):
     """Обновляет файл со стикерами, полученных с сервера.
+
+    Справочник стикеров в памяти перестраивается, только если стикеры на сервере изменились.
+    У лент без стикеров ('stickers': False) справочник пустой
+
+    Args:
+        feed (dict, optional): лента, по умолчанию - основная
     """
+    feed = feed or get_feed()
+    if not feed.get('stickers', True):
+        _sticker_catalogues[feed['name']] = sticker_catalogue.StickerCatalogue([])
+        return
     api_key = api_key_generator.get_api_key()
-    url = f'https://market.csgo.com/api/GetStickers/?key={api_key}&lang=ru' # чтобы получить словарь стикеров, маркету необходим api-ключ
+    url = f"{feed['host']}/api/GetStickers/?key={api_key}&lang=ru" # чтобы получить словарь стикеров, маркету необходим api-ключ
     stickers = query.get_content(url, flag='json') # получаем стикеры в json формате
-    write_stickers_to_file(stickers) # сохраняем стикеры
+    catalogue = _sticker_catalogues.get(feed['name'])
+    if catalogue is not None and catalogue.stickers == stickers['stickers']:
+        return # стикеры не изменились, ни файл, ни справочник трогать не нужно
+    write_stickers_to_file(stickers, get_feed_path(feed, 'stickers.json')) # сохраняем стикеры
+    _sticker_catalogues[feed['name']] = sticker_catalogue.StickerCatalogue(stickers['stickers'])
 
-def get_stickers():
+def get_stickers(feed: dict = None):
     """Возвращает все возможные стикеры с их идентификаторами на торговой площадке.
 
+    Args:
+        feed (dict, optional): лента, по умолчанию - основная
+
     Returns:
         list: список словарей со стикерами
     """
     # считываем стикеры из файла
-    with open('stickers.json', 'r', encoding='utf-8') as file:
+    with open(get_feed_path(feed or get_feed(), 'stickers.json'), 'r', encoding='utf-8') as file:
         stickers = json.load(file)
     return stickers['stickers'] # возвращаем непосредственно список словарей со стикерами
 
-def write_stickers_to_file(stickers):
+def get_sticker_catalogue(feed: dict = None):
+    """Возвращает справочник стикеров ленты; при первом вызове загружает его из stickers.json
+
+    Args:
+        feed (dict, optional): лента, по умолчанию - основная
+
+    Returns:
+        sticker_catalogue.StickerCatalogue: справочник стикеров с поиском по ID и названию
+    """
+    feed = feed or get_feed()
+    if feed['name'] not in _sticker_catalogues:
+        stickers = get_stickers(feed) if feed.get('stickers', True) else []
+        _sticker_catalogues[feed['name']] = sticker_catalogue.StickerCatalogue(stickers)
+    return _sticker_catalogues[feed['name']]
+
+def write_stickers_to_file(stickers, file_name: str = 'stickers.json'):
     """Сохраняет все стикеры в json-файл
     """
-    with open('stickers.json', 'w', encoding='utf-8') as file:
+    with open(file_name, 'w', encoding='utf-8') as file:
         json.dump(stickers, file, indent=4, ensure_ascii=False)
 
 def get_user_stickers_ids(user_stickers_names: list):
@@ -88,11 +250,13 @@ def get_user_stickers_ids(user_stickers_names: list):
     Returns:
         user_stickers_ids (list): список ID всех указанных пользователем стикеров, которые удалось найти базе данных всех стикеров
     """
-    stickers = get_stickers() # получаем стикеры из базы данных
-    # проходимся по каждому стикеру в базе данных
-    # и проверяем, есть ли название этого стикера в списке названий пользовательских стикеров;
-    # если да, то записываем его ID в список ID всех указанных пользователем стикеров
-    user_stickers_ids = [sticker['id'] for sticker in filter(lambda sticker: sticker['name'] in user_stickers_names, stickers)]
+    catalogue = get_sticker_catalogue() # справочник стикеров
+    # для каждого названия стикера пользователя берем ID стикеров с таким названием из справочника
+    user_stickers_ids = []
+    for user_sticker_name in user_stickers_names:
+        for sticker_id in catalogue.get_ids(user_sticker_name):
+            if sticker_id not in user_stickers_ids:
+                user_stickers_ids.append(sticker_id)
     return user_stickers_ids
 
 # по каким-то причинам сервер https://float.csgo.com/ лежит, возвращает ошибки типа 500
@@ -134,145 +298,106 @@ def get_user_stickers_ids(user_stickers_names: list):
 #         item_float = {}
 #     return item_float
 
-def get_item_float(classid: str, instanceid: str):
-    """Получает значения Float предмета: Float Value (потертость), Seed, Index
-
-    Args:
-        classid (str): ClassID предмета в Steam
-        instanceid (str): InstanceID предмета в Steam
-
-    Returns:
-        item_float (dict): информация float: непосредственно значение float, seed и index
-    """
-    url = f'https://market.csgo.com/float/{classid}/{instanceid}'
-    content = query.get_content(url, flag='json')
-    if content['status']:
-        item_float = {
-            'float_value': content['paintwear'], 
-            'seed': content['paintseed'],
-            'index': content['paintindex']
-        }
-    else:
-        item_float = {}
-    return item_float
-
-def get_market_items():
+def get_market_items(file_name: str = 'market_items.csv'):
     """Получает из csv-файла все предметы на продаже в фиксированный момент времени
 
     Returns:
-        market_items (list): список словарей с информацией о предмете
+        market_items (list): список предметов маркета (itemdb.MarketItem)
     """
+    return itemdb.read_market_items(file_name)
 
-    market_items = [] # заранее объявляем список предметов
-    
-    # считываем данные из csv файла
-    with open('market_items.csv', encoding='utf-8') as file:
-        reader = csv.reader(file) # создаем объект reader
-        headers = next(reader) # первая строка csv таблицы вида c_classid;c_instanceid;c_price;c_offers;c_popularity...
-        # пробегаемся по каждому предмету в таблице
-        for row in reader:
-            item_data = {} # словарь с инфой о премете
-
-            item_data['c_classid'] = row[0].split(';')[0] # ClassID предмета в Steam
-            item_data['c_instanceid'] = row[0].split(';')[1] # InstanceID предмета в Steam
-            item_data['price'] = row[0].split(';')[2] # цена предмета
-            item_data['amount'] = row[0].split(';')[3] # кол-во доступных предметов
-            item_data['quality'] = row[0].split(';')[6] # качество предмета
-            item_data['sticker_ids'] = row[0].split(';')[9] # ID стикеров для поиска названий стикеров на предмете по их ID 
-            item_data['name'] = row[0].split(';')[10] # название предмета
-            try:
-                item_data['hash_name'] = row[0].split(';')[12] # hash название предмета, некоторые методы api его требуют
-            except IndexError: # не все предметы имеют hash name
-                item_data['hash_name'] = ''
-            item_data['url'] = f"https://market.csgo.com/item/{item_data['c_classid']}-{item_data['c_instanceid']}" # на всякий ссылка на предмет
-            
-            market_items.append(item_data)
-
-    return market_items
-
-def get_formatted_price(price: str):
+def get_formatted_price(price: int):
     """Вывод цены в удобочитаемом формате
 
     Args:
-        price (str): цена
+        price (int): цена в копейках
 
     Returns:
         str: цена в нужном формате
     """
+    return f'{price // 100}.{price % 100:02d}' # разделяем копейки от рублей 12999 -> 129.99
 
-    price_list = list(price) # разбиваем строку на отдельные символы
-    price_list.insert(-2, '.') # разделяем копейки от рублей 12999 -> 129.99
-    return ''.join(price_list) # склеиваем строку обратно
-
-def get_market_item_sticker_names(sticker_ids: list):
+def get_market_item_sticker_names(sticker_ids: tuple, feed: dict = None):
     """Ищет стикеры конкретного предмета по их ID в базе всех стикеров.
     Возвращает названия всех найденных на предмете стикеров.
 
     Args:
-        sticker_ids (list): список ID стикеров на предмете
+        sticker_ids (tuple): ID стикеров на предмете
+        feed (dict, optional): лента предмета, по умолчанию - основная
 
     Returns:
         srt: названия всех найденных на предмете стикеров, разделенных ', ' 
     """
-    sticker_ids_list = sticker_ids.split('|') # разбиваем строку на отдельные ID например, (9272819286|9144421154|5227247238|)
-    stickers = get_stickers() # получаем стикеры
-    # проходимся по каждому стикеру в базе данных
-    # и проверяем, есть ли ID этого стикера в списке ID стикера предмета;
-    # если да, то записываем его название в список названий всех найденных на предмете стикеров
-    sticker_names = [sticker['name'] for sticker in filter(lambda sticker: sticker['id'] in sticker_ids_list, stickers)]
+    catalogue = get_sticker_catalogue(feed) # справочник стикеров
+    # для каждого ID стикера на предмете берем его название из справочника; неизвестные стикеры пропускаем
+    sticker_names = [catalogue.get_name(sticker_id) for sticker_id in sticker_ids if sticker_id in catalogue.id_to_name]
     return ', '.join(sticker_names)
 
-def print_item_info(item: dict):
-    """Выводит информацию переданного предмета
+def format_item_info(item: itemdb.MarketItem, item_float: dict = None, feed: dict = None):
+    """Возвращает информацию переданного предмета в виде текста уведомления
 
     Args:
-        item (dict): предмет маркета
+        item (itemdb.MarketItem): предмет маркета
+        item_float (dict, optional): информация float предмета, см. floats.get_item_float
+        feed (dict, optional): лента предмета, по умолчанию - основная
+
+    Returns:
+        str: текст уведомления
     """
-    print('#'*60)
-    print('Новый предмет!')
-    print(f"Предмет: {item['name']}")
-    print(f"Цена: {get_formatted_price(item['price'])} RUB")
-    print(f"Стикеры: {get_market_item_sticker_names(item['sticker_ids'])}")
-    # получение флот занимает много времени, т.к. нужна пауза между запросами во избежание бана
-    # item_float = get_item_float(item['c_classid'], item['c_instanceid'])
-    # if item_float:
-    #     print(f"Float: {item_float['float_value']}\nSeed: {item_float['seed']}\nIndex: {item_float['index']}")
-    print(f"Ссылка: {item['url']}")
-    print('#'*60)
-    print('\n')
-
-def search_market_items_by_stickers(market_items: list, user_stickers_ids: list, searched_items: list):
-    """Ищет по стикерам предметы в базе данных всех вещей на продаже
+    lines = [
+        '#'*60,
+        'Новый предмет!',
+        f"Предмет: {item.name}",
+        f"Цена: {get_formatted_price(item.price)} RUB",
+        f"Стикеры: {get_market_item_sticker_names(item.sticker_ids, feed)}",
+    ]
+    if item_float:
+        lines.append(f"Float: {item_float['float_value']}\nSeed: {item_float['seed']}\nIndex: {item_float['index']}")
+    lines.append(f"Ссылка: {item.get_url((feed or get_feed())['host'])}")
+    lines.append('#'*60)
+    return '\n'.join(lines) + '\n\n\n\n'
+
+def print_item_info(item: itemdb.MarketItem, item_float: dict = None, file=None):
+    """Выводит информацию переданного предмета
 
     Args:
-        market_items (list): список словарей с информацией о предмете
-        user_stickers_ids (list): список ID пользовательских стикеров
-        searched_items (list): найденные предметы
-
-    Returns:
-        searched_items (list): найденные предметы
+        item (itemdb.MarketItem): предмет маркета
+        item_float (dict, optional): информация float предмета, см. floats.get_item_float
+        file (optional): куда выводить, по умолчанию - в консоль
     """
-    for item in market_items: # проходимся по каждому предмету на площадке
-        #if any(map(lambda user_sticker_id: user_sticker_id in item['sticker_ids'].split('|') and item not in searched_items, user_stickers_ids))
-        for user_sticker_id in user_stickers_ids: # проходимся по каждому ID пользовательских стикеров
-            # если очередной ID стикера пользователя в списке ID стикеров предмета и не в списке найденных предметов,
-            # то добавляем предмет в список найденных и выводим его инфу
-            if user_sticker_id in item['sticker_ids'].split('|') and item not in searched_items:
-                searched_items.append(item)
-                print_item_info(item)
-    # оставляем в списке найденных предметов только те предметы, которые есть в списке всех предметов маркета
-    # таким образом, длина списка найденных предметов никогда не будет превышать длину списка всех предметов маркета
-    searched_items = list(filter(lambda item: item in market_items, searched_items))
-    return searched_items
-
-def write_searched_items_to_file(searched_items: list):
-    """Записывает найденные предметы в json файл
+    print(format_item_info(item, item_float), end='', file=file)
+
+def search_market_items_by_stickers(market_diff: snapshot_diff.SnapshotDiff, rule_engine: rules.RuleEngine, searched_items: dict):
+    """Ищет по правилам пользователя (стикеры, цена, качество и т.д.) предметы среди изменений базы данных вещей на продаже.
+    Возвращает все найденные предметы и отдельно - найденные в этом цикле, о которых нужно уведомить
+
+    Проверяются только новые предметы и предметы с изменившейся ценой, поэтому время поиска
+    пропорционально кол-ву изменений на площадке, а не кол-ву всех предметов
 
     Args:
-        searched_items (list): найденные предметы маркета
+        market_diff (snapshot_diff.SnapshotDiff): изменения между прошлым и текущим снимком базы данных
+        rule_engine (rules.RuleEngine): скомпилированные правила пользователя
+        searched_items (dict): найденные предметы вида {ключ предмета: предмет}
+
+    Returns:
+        tuple: (найденные предметы вида {ключ предмета: предмет}, список новых найденных предметов,
+            список найденных ранее предметов, которые после смены цены больше не подходят под правила)
     """
-    with open('searched_items.json', 'w', encoding='utf-8') as file:
-        json.dump(searched_items, file, indent=4, ensure_ascii=False)
+    # убираем из найденных предметов те, которых больше нет на площадке
+    # таким образом, кол-во найденных предметов никогда не будет превышать кол-во всех предметов маркета
+    for item in market_diff.removed:
+        searched_items.pop(item.key, None)
+
+    # новый предмет (или старый с новой ценой), подошедший хотя бы под одно правило, записываем в найденные
+    found_items = [item for item, _ in rule_engine.match_items(market_diff.changed)]
+    found_keys = {item.key for item in found_items}
+    # найденный ранее предмет с новой ценой может перестать подходить (например, по максимальной цене) - он больше не найден
+    unmatched_items = [
+        item for item in market_diff.price_changed
+        if item.key not in found_keys and searched_items.pop(item.key, None) is not None
+    ]
+    searched_items.update((item.key, item) for item in found_items)
+    return searched_items, found_items, unmatched_items
 
 def get_user_stickers_from_file():
     """Получает стикеры пользователя из файла
@@ -284,26 +409,306 @@ def get_user_stickers_from_file():
         user_stickers = f.read().split('\n')
     return user_stickers
 
+def get_user_rule_engine(feed: dict = None):
+    """Компилирует правила поиска пользователя
+
+    Правила берутся из rules.json, а если его нет - из user_stickers.txt:
+    в этом случае ищутся предметы хотя бы с одним из указанных стикеров
+
+    Args:
+        feed (dict, optional): лента, по справочнику стикеров которой компилируются правила, по умолчанию - основная
+
+    Returns:
+        rules.RuleEngine: скомпилированные правила
+    """
+    if os.path.exists('rules.json'):
+        user_rules = rules.load_rules('rules.json')
+    else:
+        user_stickers_names = [name for name in get_user_stickers_from_file() if name] # достаем пользовательские стикеры
+        user_rules = [{'name': 'Стикеры из user_stickers.txt', 'stickers': user_stickers_names}]
+    return rules.RuleEngine.from_rules(user_rules, get_sticker_catalogue(feed))
+
+def get_watchlists():
+    """Возвращает списки наблюдения: у каждого свои правила, свои найденные предметы и свой вывод
+
+    Списки берутся из watchlists.json вида
+    {"watchlists": [{"name": "Вася", "rules": "rules_vasya.json", "output": "hits_vasya.txt", "feed": "csgo"}, ...]},
+    где output необязателен (по умолчанию - вывод в консоль), а feed - имя ленты из config.FEEDS (по умолчанию - основная).
+    Если файла нет, то список один - правила пользователя для основной ленты, см. get_user_rule_engine
+
+    Returns:
+        watchlists (list): списки наблюдения
+    """
+    if not os.path.exists('watchlists.json'):
+        return [{'name': '', 'feed': get_feed(), 'rule_engine': get_user_rule_engine(), 'output': None, 'searched_items': {}}]
+    with open('watchlists.json', 'r', encoding='utf-8') as f:
+        watchlists_config = json.load(f)['watchlists']
+    watchlists = []
+    for watchlist_config in watchlists_config:
+        watchlist_rules = rules.load_rules(watchlist_config['rules'])
+        feed = get_feed(watchlist_config.get('feed'))
+        watchlists.append({
+            'name': watchlist_config['name'], # имя списка, под ним сохраняются найденные предметы
+            'feed': feed, # лента, в которой ищутся предметы
+            'rule_engine': rules.RuleEngine.from_rules(watchlist_rules, get_sticker_catalogue(feed)), # правила поиска
+            'output': watchlist_config.get('output'), # файл, в который выводятся найденные предметы
+            'searched_items': {}, # найденные предметы вида {ключ предмета: предмет}
+        })
+    return watchlists
+
+def restore_found_items(watchlists: list, market_store: storage.MarketStore):
+    """Восстанавливает найденные предметы списков наблюдения после перезапуска из таблицы hits
+
+    Восстановленные предметы возвращаются и как снимок бд: если сохраненного снимка нет, то при первом сравнении
+    они не попадут в новые (если цена не изменилась), а проданные за время простоя - попадут в проданные.
+    Так бот не уведомляет повторно о предметах, о которых уже уведомлял до перезапуска
+
+    Args:
+        watchlists (list): списки наблюдения, см. get_watchlists
+        market_store (storage.MarketStore): хранилище истории
+
+    Returns:
+        dict: найденные предметы всех списков вида {ключ предмета: предмет}
+    """
+    found_snapshot = {}
+    for watchlist in watchlists:
+        watchlist['searched_items'] = snapshot_diff.index_market_items(market_store.get_active_hit_items(watchlist['name']))
+        found_snapshot.update(watchlist['searched_items'])
+    return found_snapshot
+
+def search_watchlists(market_diff: snapshot_diff.SnapshotDiff, watchlists: list):
+    """Ищет предметы по всем спискам наблюдения в одном и том же снимке базы данных
+
+    Снимок скачивается, разбирается и сравнивается с прошлым один раз на всех,
+    на каждый список приходится только проверка изменившихся предметов по его правилам
+
+    Args:
+        market_diff (snapshot_diff.SnapshotDiff): изменения между прошлым и текущим снимком базы данных
+        watchlists (list): списки наблюдения, см. get_watchlists
+
+    Returns:
+        list: тройки (список наблюдения, новые найденные предметы, предметы, переставшие подходить под правила)
+    """
+    found_by_watchlist = []
+    for watchlist in watchlists:
+        watchlist['searched_items'], found_items, unmatched_items = search_market_items_by_stickers(
+            market_diff, watchlist['rule_engine'], watchlist['searched_items']
+        )
+        found_by_watchlist.append((watchlist, found_items, unmatched_items))
+    return found_by_watchlist
+
+def create_notifier(watchlists: list, float_enricher: floats.FloatEnricher = None):
+    """Создает уведомитель: у каждого списка наблюдения свой вывод (консоль или файл),
+    плюс общие для всех списков JSON Lines-файл и webhook, если они заданы в config.py
+
+    Args:
+        watchlists (list): списки наблюдения, см. get_watchlists
+        float_enricher (floats.FloatEnricher, optional): получатель float предметов
+
+    Returns:
+        notifications.Notifier: уведомитель
+    """
+    sinks = [
+        notifications.TextSink(functools.partial(format_item_info, feed=watchlist['feed']), watchlist['output'], watchlist['name'])
+        for watchlist in watchlists
+    ]
+    if config.NOTIFY_JSONL_FILE:
+        sinks.append(notifications.JsonlSink(config.NOTIFY_JSONL_FILE))
+    if config.NOTIFY_WEBHOOK_URL:
+        sinks.append(notifications.WebhookSink(config.NOTIFY_WEBHOOK_URL))
+    return notifications.Notifier(sinks, float_enricher)
+
+def fetch_market_items(snapshot_state: dict, poll_scheduler: scheduler.PollScheduler):
+    """Этап конвейера: ждет появления нового снимка бд и скачивает его в отдельный файл
+
+    Каждый снимок скачивается в свой файл, чтобы следующий снимок можно было скачивать, пока прошлый еще разбирается
+
+    Args:
+        snapshot_state (dict): состояние последнего снимка базы данных
+        poll_scheduler (scheduler.PollScheduler): расписание опроса
+
+    Returns:
+        tuple or None: (имя файла базы данных маркета, скачанный файл) или None, если снимок не изменился или конвейер остановлен
+    """
+    if poll_scheduler.wait(): # пауза до следующего опроса: до ожидаемого появления нового снимка или чуть дольше
+        return None # конвейер остановлен во время ожидания
+    feed = snapshot_state['feed']
+    root, ext = os.path.splitext(get_feed_path(feed, 'market_items.csv'))
+    file_name = f"{root}.{snapshot_state['downloads'] + 1}{ext}"
+    try:
+        market_items_updated = update_market_items(snapshot_state, file_name) # обновляем бд предметов на продаже
+    except Exception as e: # любая неудача опроса учитывается, иначе планировщик не увеличит паузу и опрос пойдет без остановки
+        print(f'Не удалось обновить базу данных предметов{get_feed_label(feed)}: {e!r}')
+        poll_scheduler.record_error()
+        metrics.inc('polls_total', result='error', feed=feed['name'])
+        return None
+    # если снимок не изменился, то и искать заново нечего
+    if not market_items_updated:
+        poll_scheduler.record_unchanged()
+        metrics.inc('polls_total', result='unchanged', feed=feed['name'])
+        return None
+    poll_scheduler.record_change()
+    metrics.inc('polls_total', result='changed', feed=feed['name'])
+    snapshot_state['downloads'] += 1
+    return snapshot_state['db'], file_name
+
+def parse_market_items(downloaded: tuple, parser_state: dict, parse_executor: concurrent.futures.Executor = None):
+    """Этап конвейера: разбирает скачанный снимок и сравнивает его с прошлым
+
+    Если передан процесс ленты, то разбор и сравнение идут в нем (см. feed_worker): разбор нескольких лент
+    идет параллельно, а не по очереди из-за GIL. Прошлый снимок в этом случае хранится в процессе ленты
+
+    Args:
+        downloaded (tuple): (имя файла базы данных маркета, скачанный файл)
+        parser_state (dict): {'feed': лента, 'market_snapshot': прошлый снимок бд вида {ключ предмета: предмет}
+            или None, если он уже передан в процесс ленты}
+        parse_executor (concurrent.futures.Executor, optional): процесс ленты (пул из одного процесса)
+
+    Returns:
+        tuple: (имя файла базы данных маркета, изменения с прошлого снимка, кол-во предметов в снимке)
+    """
+    db_name, file_name = downloaded
+    feed = parser_state['feed']
+    items_file_name = get_feed_path(feed, 'market_items.csv')
+    os.replace(file_name, items_file_name) # в market_items.csv всегда лежит последний разобранный снимок
+    columnar_cache_dir = get_feed_path(feed, config.COLUMNAR_CACHE_DIR) if config.USE_COLUMNAR else None
+    start = time.perf_counter()
+    if parse_executor is not None:
+        market_diff, items_count = parse_executor.submit(
+            feed_worker.diff_market_items_file, feed['name'], items_file_name, parser_state['market_snapshot'], db_name, columnar_cache_dir
+        ).result()
+        parser_state['market_snapshot'] = None # дальше прошлый снимок хранится в процессе ленты
+    else:
+        # предметы читаются построчно и сразу индексируются, без промежуточного списка всех предметов снимка
+        current_snapshot = snapshot_diff.index_market_items(itemdb.iter_market_items(items_file_name))
+        market_diff = snapshot_diff.diff_snapshots(parser_state['market_snapshot'], current_snapshot) # что поменялось с прошлого снимка
+        parser_state['market_snapshot'] = current_snapshot
+        items_count = len(current_snapshot)
+        if columnar_cache_dir is not None: # сохраняем снимок, чтобы после перезапуска загрузить его за миллисекунды
+            columnar.ColumnarSnapshot.from_items(current_snapshot.values(), db_name).save(columnar_cache_dir)
+    elapsed = time.perf_counter() - start
+    metrics.inc('rows_parsed_total', items_count, feed=feed['name'])
+    metrics.observe('parse_seconds', elapsed, feed=feed['name'])
+    metrics.set('parse_rows_per_second', round(items_count / elapsed) if elapsed else 0, feed=feed['name'])
+    return db_name, market_diff, items_count
+
+def match_market_items(parsed: tuple, watchlists: list):
+    """Этап конвейера: ищет предметы по спискам наблюдения среди изменений снимка
+
+    Args:
+        parsed (tuple): (имя файла базы данных маркета, изменения с прошлого снимка, кол-во предметов в снимке)
+        watchlists (list): списки наблюдения
+
+    Returns:
+        tuple: то же, что и parsed, плюс результат search_watchlists
+    """
+    start = time.perf_counter()
+    found_by_watchlist = search_watchlists(parsed[1], watchlists)
+    metrics.observe('match_seconds', time.perf_counter() - start)
+    for watchlist, found_items, _ in found_by_watchlist:
+        metrics.set('hits_last_cycle', len(found_items), watchlist=watchlist['name'])
+        metrics.inc('hits_total', len(found_items), watchlist=watchlist['name'])
+    return (*parsed, found_by_watchlist)
+
+def notify_found_items(matched: tuple, feed: dict, market_store: storage.MarketStore, notifier: notifications.Notifier):
+    """Этап конвейера: сохраняет снимок и найденные предметы в историю и передает найденные предметы уведомителю
+
+    Args:
+        matched (tuple): результат match_market_items
+        feed (dict): лента снимка
+        market_store (storage.MarketStore): хранилище истории
+        notifier (notifications.Notifier): уведомитель, выводит предметы в своем потоке
+    """
+    db_name, market_diff, items_count, found_by_watchlist = matched
+    snapshot_id = market_store.record_snapshot(db_name, market_diff, items_count, feed['name']) # в историю пишем только изменения
+    if config.HITS_RETENTION_DAYS and snapshot_id % config.HITS_COMPACT_EVERY == 0:
+        market_store.compact_hits(config.HITS_RETENTION_DAYS * 24 * 60 * 60) # время от времени чистим журнал найденных предметов
+    if config.HISTORY_RETENTION_DAYS and snapshot_id % config.HITS_COMPACT_EVERY == 0:
+        market_store.compact_history(config.HISTORY_RETENTION_DAYS * 24 * 60 * 60) # и историю изменений предметов и цен
+    for watchlist, found_items, unmatched_items in found_by_watchlist:
+        # сохраняем найденные предметы; записи проданных и переставших подходить под правила закрываются
+        market_store.update_hits(snapshot_id, found_items, [*market_diff.removed, *unmatched_items], watchlist['name'])
+        # уведомляем о новых предметах, не дожидаясь вывода; float запрашивается только у площадок, где он есть
+        notifier.notify(watchlist['name'], found_items, watchlist['feed']['host'], watchlist['feed'].get('floats', False))
+
+def create_feed_pipeline(feed: dict, watchlists: list, market_store: storage.MarketStore, notifier: notifications.Notifier,
+                         parse_executor: concurrent.futures.Executor = None):
+    """Создает конвейер ленты: у каждой ленты свое состояние снимка, свое расписание опроса и свои списки наблюдения,
+    а хранилище истории и уведомитель общие
+
+    Args:
+        feed (dict): лента
+        watchlists (list): все списки наблюдения, конвейер берет только списки своей ленты
+        market_store (storage.MarketStore): хранилище истории
+        notifier (notifications.Notifier): уведомитель
+        parse_executor (concurrent.futures.Executor, optional): процесс ленты для разбора
+
+    Returns:
+        pipeline.Pipeline: конвейер ленты
+    """
+    feed_watchlists = [watchlist for watchlist in watchlists if watchlist['feed'] is feed]
+    snapshot_state = get_initial_snapshot_state(feed) # состояние последнего скачанного снимка бд
+    parser_state = {'feed': feed, 'market_snapshot': {}} # прошлый снимок бд вида {ключ предмета: предмет}
+    if config.USE_COLUMNAR:
+        parser_state['market_snapshot'] = load_cached_market_snapshot(snapshot_state)
+    found_snapshot = restore_found_items(feed_watchlists, market_store) # найденные до перезапуска предметы
+    if not parser_state['market_snapshot']:
+        parser_state['market_snapshot'] = found_snapshot
+
+    # при нескольких лентах к названиям этапов добавляется имя ленты: csgo.fetch, dota2.fetch...
+    prefix = f"{feed['name']}." if len(config.FEEDS) > 1 else ''
+    feed_pipeline = pipeline.Pipeline(
+        config.PIPELINE_QUEUE_SIZE, config.PIPELINE_LOG_TIMINGS, config.PROFILE_DIR if config.PROFILE_ENABLED else None
+    )
+    # подстраивает опрос под расписание обновления бд; остановка конвейера прерывает паузу между опросами
+    poll_scheduler = scheduler.PollScheduler(stop_event=feed_pipeline.stop_event)
+    feed_pipeline.add_stage(f'{prefix}fetch', functools.partial(fetch_market_items, snapshot_state, poll_scheduler))
+    feed_pipeline.add_stage(f'{prefix}parse', functools.partial(parse_market_items, parser_state=parser_state, parse_executor=parse_executor))
+    feed_pipeline.add_stage(f'{prefix}match', functools.partial(match_market_items, watchlists=feed_watchlists))
+    feed_pipeline.add_stage(f'{prefix}notify', functools.partial(notify_found_items, feed=feed, market_store=market_store, notifier=notifier))
+    return feed_pipeline
+
 def main():
-    # если аутентификация не прошла, то завершаем работу
-    if not login.login_to_steam():
+    # если аутентификация не прошла, то завершаем работу; при действительных cookies браузер не запускается
+    if not login.ensure_logged_in():
         return False
 
     # если пользователь не указал api-ключ, то генерируем его самостоятельно
     if not os.path.getsize('api_key.txt'):
         api_key_generator.create_api_key() # генерируем api-ключ
-    update_stickers() # обновляем стикеры
-
-    user_stickers_names = get_user_stickers_from_file() # достаем пользовательские стикеры
-    user_stickers_ids = get_user_stickers_ids(user_stickers_names) # получаем ID пользовательских стикеров
-    searched_items = [] # инициализируем список найденных вещей
-    # предпологается, что бот постоянно уведомляет о новых предметах
-    while True:
-        update_market_items() # обновляем бд предметов на продаже
-        market_items = get_market_items() # получаем предметы маркета 
-        searched_items = search_market_items_by_stickers(market_items, user_stickers_ids, searched_items) # поиск нужных предметов
-        write_searched_items_to_file(searched_items) # на всякий перезаписываем каждый раз список найденных предметов, таким образом в файле всегда относительно актуальные предметы
-        time.sleep(60) # пауза между обновлением бд предметов
+    for feed in config.FEEDS:
+        update_stickers(feed) # обновляем стикеры
+
+    watchlists = get_watchlists() # списки наблюдения со своими правилами и найденными предметами
+    float_enricher = floats.FloatEnricher() if config.FLOAT_ENABLED else None # float найденных предметов
+    market_store = storage.MarketStore(default_feed=get_feed()['name']) # история снимков, цен и найденных предметов
+    notifier = create_notifier(watchlists, float_enricher) # выводит найденные предметы пачками в своем потоке
+    # разбор csv нагружает процессор, поэтому несколько лент разбираются параллельно, каждая в своем процессе
+    parse_in_processes = len(config.FEEDS) > 1 if config.PARSE_IN_PROCESSES is None else config.PARSE_IN_PROCESSES
+    parse_executors = [
+        concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=feed_worker.ignore_interrupts) if parse_in_processes else None
+        for _ in config.FEEDS
+    ]
+
+    if config.METRICS_PORT:
+        start_metrics_server(config.METRICS_HOST, config.METRICS_PORT) # метрики в формате Prometheus по адресу /metrics
+    if config.METRICS_LOG_INTERVAL:
+        start_metrics_logger(config.METRICS_LOG_INTERVAL) # метрики одной строкой json в консоль
+
+    # предпологается, что бот постоянно уведомляет о новых предметах:
+    # скачивание, разбор, поиск и вывод работают одновременно в своих потоках, каждый над своим снимком,
+    # а ленты обрабатываются параллельно, поэтому цикл длится столько, сколько самая медленная лента
+    feed_pipelines = [
+        create_feed_pipeline(feed, watchlists, market_store, notifier, parse_executor)
+        for feed, parse_executor in zip(config.FEEDS, parse_executors)
+    ]
+    pipeline.run_pipelines(feed_pipelines)
+    notifier.close() # выводим то, что еще не успело выйти
+    if float_enricher is not None:
+        float_enricher.close()
+    for parse_executor in parse_executors:
+        if parse_executor is not None:
+            parse_executor.shutdown()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,150 @@
+import http.server
+import json
+import threading
+import time
+
+
+PREFIX = 'csgomarketbot_' # общий префикс метрик
+
+
+class Metrics:
+    """Счетчики, текущие значения и суммарное время работы бота
+
+    Метрики различаются названием и метками, например http_responses_total{status="200"}.
+    Для замеров времени (observe) хранится кол-во замеров и их сумма, как у summary в Prometheus
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {} # (название, метки) -> значение, только растет
+        self.gauges = {} # (название, метки) -> последнее значение
+        self.summaries = {} # (название, метки) -> [кол-во замеров, сумма]
+
+    @staticmethod
+    def get_key(name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Увеличивает счетчик
+        """
+        key = self.get_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """Запоминает текущее значение
+        """
+        with self.lock:
+            self.gauges[self.get_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Добавляет замер (обычно время в секундах)
+        """
+        key = self.get_key(name, labels)
+        with self.lock:
+            summary = self.summaries.setdefault(key, [0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+
+    @staticmethod
+    def format_name(name: str, labels: tuple, suffix: str = ''):
+        formatted_labels = ','.join(
+            f'{label}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for label, value in labels
+        )
+        return f'{PREFIX}{name}{suffix}' + (f'{{{formatted_labels}}}' if formatted_labels else '')
+
+    def get(self):
+        """Возвращает все метрики плоским словарем для записи в лог
+
+        Returns:
+            dict: название метрики с метками -> значение
+        """
+        values = {}
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                values[self.format_name(name, labels)] = value
+            for (name, labels), value in sorted(self.gauges.items()):
+                values[self.format_name(name, labels)] = value
+            for (name, labels), (count, total) in sorted(self.summaries.items()):
+                values[self.format_name(name, labels, '_count')] = count
+                values[self.format_name(name, labels, '_sum')] = round(total, 6)
+        return values
+
+    def format_prometheus(self):
+        """Возвращает метрики в текстовом формате Prometheus
+        """
+        lines = []
+        with self.lock:
+            for metric_type, values in (('counter', self.counters), ('gauge', self.gauges), ('summary', self.summaries)):
+                described = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in described:
+                        lines.append(f'# TYPE {PREFIX}{name} {metric_type}')
+                        described.add(name)
+                    if metric_type == 'summary':
+                        lines.append(f'{self.format_name(name, labels, "_count")} {value[0]}')
+                        lines.append(f'{self.format_name(name, labels, "_sum")} {value[1]}')
+                    else:
+                        lines.append(f'{self.format_name(name, labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics() # общие метрики бота, в них пишут все модули
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Отдает метрики по адресу /metrics
+    """
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.format_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # каждый запрос метрик в консоль не выводим
+
+
+def start_metrics_server(host: str, port: int):
+    """Запускает http-сервер с метриками в фоновом потоке
+
+    Args:
+        host (str): адрес, по умолчанию метрики доступны только с этого компьютера
+        port (int): порт
+
+    Returns:
+        http.server.ThreadingHTTPServer or None: запущенный сервер или None, если порт занят
+    """
+    try:
+        server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e: # например, порт занят другим экземпляром бота на этом же сервере
+        print(f'Не удалось запустить сервер метрик на {host}:{port}: {e}. Бот продолжит работу без него')
+        return None
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+def log_metrics(file=None):
+    """Выводит все метрики одной строкой в формате json
+    """
+    print(f"Метрики: {json.dumps({'time': round(time.time()), **metrics.get()}, ensure_ascii=False)}", file=file)
+
+
+def start_metrics_logger(interval: float):
+    """Раз в interval секунд выводит метрики в фоновом потоке
+
+    Args:
+        interval (float): период вывода в секундах
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            log_metrics()
+    threading.Thread(target=run, name='metrics-logger', daemon=True).start()
@@ -0,0 +1,276 @@
+import collections
+import itertools
+import json
+import sys
+import threading
+import time
+from typing import NamedTuple, Optional
+import config
+import itemdb
+import query
+from metrics import metrics
+
+
+class Notification(NamedTuple):
+    """Уведомление о найденном предмете
+    """
+    watchlist: str # имя списка наблюдения, в котором найден предмет
+    item: itemdb.MarketItem # найденный предмет
+    found_at: float # когда предмет найден (unix-время)
+    url: str # ссылка на предмет на площадке его ленты
+    item_float: Optional[dict] = None # информация float, если она уже есть в кэше
+    kind: str = 'hit' # 'hit' - найден предмет, 'float' - получен float ранее найденного предмета
+    float_host: Optional[str] = None # площадка, у которой запрашивать float, None - у площадки ленты float нет
+
+    def to_dict(self):
+        return {
+            'kind': self.kind, 'watchlist': self.watchlist, 'found_at': self.found_at, **self.item.to_dict(), 'url': self.url,
+            'float': self.item_float or None
+        }
+
+
+def format_float_notification(notification: Notification):
+    """Возвращает текст уведомления о полученном float ранее найденного предмета
+    """
+    item_float = notification.item_float
+    return (
+        f"Float предмета {notification.item.name}: {item_float['float_value']} "
+        f"(Seed: {item_float['seed']}, Index: {item_float['index']})\nСсылка: {notification.url}\n\n"
+    )
+
+
+class TextSink:
+    """Выводит уведомления текстом в консоль или дописывает в текстовый файл
+
+    Текст всей пачки собирается в одну строку и выводится одной записью, а не построчно
+    """
+
+    def __init__(self, format_item, file_name: str = None, watchlist: str = None):
+        """
+        Args:
+            format_item (callable): функция (предмет, float) -> текст уведомления
+            file_name (str, optional): файл для вывода, по умолчанию - консоль
+            watchlist (str, optional): выводить только уведомления этого списка наблюдения, по умолчанию - все
+        """
+        self.format_item = format_item
+        self.file_name = file_name
+        self.watchlist = watchlist
+
+    def send(self, notifications: list):
+        if self.watchlist is not None:
+            notifications = [notification for notification in notifications if notification.watchlist == self.watchlist]
+        if not notifications:
+            return
+        parts = []
+        for watchlist, watchlist_notifications in itertools.groupby(notifications, key=lambda notification: notification.watchlist):
+            if watchlist and self.file_name is None:
+                parts.append(f'Список наблюдения: {watchlist}\n')
+            parts.extend(
+                format_float_notification(notification) if notification.kind == 'float' else self.format_item(notification.item, notification.item_float)
+                for notification in watchlist_notifications
+            )
+        text = ''.join(parts)
+        if self.file_name is None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            with open(self.file_name, 'a', encoding='utf-8') as file:
+                file.write(text)
+
+
+class JsonlSink:
+    """Дописывает уведомления в файл формата JSON Lines: по одному json-объекту на строку
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+    def send(self, notifications: list):
+        with open(self.file_name, 'a', encoding='utf-8') as file:
+            file.write(''.join(json.dumps(notification.to_dict(), ensure_ascii=False) + '\n' for notification in notifications))
+
+
+class WebhookSink:
+    """Отправляет пачку уведомлений одним POST-запросом с json вида {"notifications": [...]}
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def send(self, notifications: list):
+        response = query.send_request('POST', self.url, json={'notifications': [notification.to_dict() for notification in notifications]})
+        response.raise_for_status()
+
+
+class Notifier:
+    """Собирает уведомления о найденных предметах и выводит их пачками в фоновом потоке
+
+    notify только кладет предметы в буфер и сразу возвращается, поэтому скорость поиска не зависит от скорости вывода.
+    Уведомления об одном и том же предмете в одном списке наблюдения, не успевшие выйти, объединяются в одно
+    (с последней ценой). Буфер ограничен: при переполнении новые уведомления пропускаются,
+    а в консоль выводится, сколько их пропущено - найденные предметы при этом все равно сохраняются в market.db
+
+    Найденные предметы выводятся сразу, не дожидаясь float: сервер float ограничен парой запросов в секунду.
+    Float из кэша выводится вместе с предметом, остальные запрашиваются в фоне (не больше float_limit одновременно,
+    остальные ждут своей очереди) и выводятся отдельным уведомлением, когда придет ответ
+    """
+
+    def __init__(self, sinks: list, float_enricher=None, buffer_size: int = config.NOTIFY_BUFFER_SIZE,
+                 batch_size: int = config.NOTIFY_BATCH_SIZE, float_limit: int = config.NOTIFY_FLOAT_LIMIT):
+        """
+        Args:
+            sinks (list): получатели уведомлений (TextSink, JsonlSink, WebhookSink или любой объект с методом send)
+            float_enricher (floats.FloatEnricher, optional): получатель float предметов
+            buffer_size (int): сколько уведомлений может ждать вывода
+            batch_size (int): максимальный размер пачки
+            float_limit (int): сколько запросов float может выполняться одновременно, остальные ждут в очереди
+        """
+        self.sinks = sinks
+        self.float_enricher = float_enricher
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.float_limit = float_limit
+        self.float_requests = 0 # сколько потоков сейчас запрашивают float
+        self.float_queue = collections.deque() # группы уведомлений об одном предмете, ждущие запроса float
+        self.condition = threading.Condition()
+        self.pending = {} # (вид уведомления, список наблюдения, ключ предмета) -> уведомление
+        self.dropped = 0 # сколько уведомлений пропущено из-за переполнения буфера
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='notifier', daemon=True)
+        self.thread.start()
+
+    def notify(self, watchlist: str, items: list, host: str = 'https://market.csgo.com', with_floats: bool = True):
+        """Добавляет найденные предметы в буфер уведомлений, не дожидаясь вывода
+
+        Args:
+            watchlist (str): имя списка наблюдения
+            items (list): найденные предметы
+            host (str): площадка, на которой найдены предметы
+            with_floats (bool): есть ли у площадки float, если нет - float для этих предметов не запрашивается
+        """
+        if not items:
+            return
+        now = time.time()
+        float_host = host if with_floats else None
+        with self.condition:
+            for item in items:
+                self.add_pending(Notification(watchlist, item, now, item.get_url(host), float_host=float_host))
+            self.condition.notify()
+
+    def add_pending(self, notification: Notification):
+        """Кладет уведомление в буфер, объединяя его с еще не вышедшим уведомлением о том же предмете; вызывается под self.condition
+        """
+        key = (notification.kind, notification.watchlist, notification.item.key)
+        if key in self.pending:
+            metrics.inc('notifications_coalesced_total')
+        elif len(self.pending) >= self.buffer_size:
+            self.dropped += 1
+            metrics.inc('notifications_dropped_total')
+            return
+        self.pending[key] = notification
+
+    def take_pending(self):
+        """Ждет уведомлений и забирает весь буфер
+
+        Returns:
+            tuple: (уведомления, кол-во пропущенных) или None, если уведомлений нет и уведомитель закрыт
+        """
+        with self.condition:
+            while not self.pending and not self.dropped and not self.closed:
+                self.condition.wait()
+            if not self.pending and not self.dropped:
+                return None
+            notifications, dropped = list(self.pending.values()), self.dropped
+            self.pending, self.dropped = {}, 0
+            return notifications, dropped
+
+    def run(self):
+        while True:
+            taken = self.take_pending()
+            if taken is None:
+                break
+            notifications, dropped = taken
+            if dropped:
+                print(f'Буфер уведомлений переполнен: пропущено {dropped} уведомлений, найденные предметы сохранены в market.db (таблица hits)')
+            if self.float_enricher is not None:
+                notifications = self.add_cached_floats(notifications)
+            for start in range(0, len(notifications), self.batch_size):
+                self.send(notifications[start:start + self.batch_size])
+            if self.float_enricher is not None:
+                self.request_floats(notifications)
+
+    def add_cached_floats(self, notifications: list):
+        """Добавляет к уведомлениям о найденных предметах float из кэша
+        """
+        return [
+            notification._replace(item_float=self.float_enricher.get_cached_float(notification.item))
+            if notification.kind == 'hit' and notification.float_host is not None else notification
+            for notification in notifications
+        ]
+
+    def request_floats(self, notifications: list):
+        """Запрашивает в фоне float предметов, которых не было в кэше; ответ выводится отдельным уведомлением
+        """
+        # один предмет может быть найден в нескольких списках наблюдения, float для него запрашивается один раз
+        notifications_by_key = {}
+        for notification in notifications:
+            if notification.kind == 'hit' and notification.float_host is not None and notification.item_float is None:
+                notifications_by_key.setdefault((notification.float_host, notification.item.key), []).append(notification)
+        with self.condition:
+            for key_notifications in notifications_by_key.values():
+                # очередь ограничена, как и буфер уведомлений: предметы, не поместившиеся в нее, остаются без float
+                if len(self.float_queue) >= self.buffer_size:
+                    metrics.inc('float_requests_skipped_total')
+                    continue
+                self.float_queue.append(key_notifications)
+            # запросы запускаются, пока есть свободные места; занятые места освобождаются, когда очередь опустеет
+            start_requests = min(len(self.float_queue), self.float_limit - self.float_requests)
+            self.float_requests += start_requests
+            metrics.set('float_requests_queued', len(self.float_queue))
+        for _ in range(start_requests):
+            self.float_enricher.executor.submit(self.fetch_floats)
+
+    def fetch_floats(self):
+        """Запрашивает float предметов из очереди по одному, пока очередь не опустеет; выполняется в потоке float_enricher
+
+        Частоту запросов ограничивает float_enricher, поэтому очередь разбирается с той скоростью, которую позволяет сервер float
+        """
+        while True:
+            with self.condition:
+                if not self.float_queue or self.closed: # после закрытия уведомителя ответы уже некому вывести
+                    self.float_requests -= 1
+                    return
+                notifications = self.float_queue.popleft()
+                metrics.set('float_requests_queued', len(self.float_queue))
+            try:
+                item_float = self.float_enricher.fetch_float(notifications[0].item, notifications[0].float_host)
+            except Exception as e: # например, не удалось дописать кэш; поток не должен завершиться, не освободив место
+                print(f'Не удалось получить float предмета {notifications[0].item.name}: {e!r}')
+                continue
+            if not item_float:
+                continue
+            with self.condition:
+                for notification in notifications:
+                    self.add_pending(notification._replace(item_float=item_float, kind='float'))
+                self.condition.notify()
+
+    def send(self, batch: list):
+        """Отправляет пачку всем получателям; ошибка одного получателя не мешает остальным
+        """
+        start = time.perf_counter()
+        for sink in self.sinks:
+            try:
+                sink.send(batch)
+            except Exception as e:
+                metrics.inc('notify_errors_total', sink=type(sink).__name__)
+                print(f'Не удалось отправить уведомления ({type(sink).__name__}): {e!r}')
+        metrics.inc('notifications_total', len(batch))
+        metrics.observe('notify_flush_seconds', time.perf_counter() - start)
+
+    def close(self, timeout: float = None):
+        """Выводит оставшиеся уведомления и останавливает фоновый поток
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout)
@@ -0,0 +1,200 @@
+import cProfile
+import os
+import queue
+import threading
+import time
+from metrics import metrics
+
+
+STOP = object() # сигнал остановки, который этапы передают друг другу по очереди
+
+
+class StageTimings:
+    """Время работы этапов конвейера: сколько раз выполнялся, суммарное, последнее и максимальное время
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {} # название этапа -> {'count', 'total', 'last', 'max'}
+
+    def record(self, stage_name: str, elapsed: float):
+        with self.lock:
+            timing = self.stages.setdefault(stage_name, {'count': 0, 'total': 0.0, 'last': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += elapsed
+            timing['last'] = elapsed
+            timing['max'] = max(timing['max'], elapsed)
+        metrics.observe('pipeline_stage_seconds', elapsed, stage=stage_name)
+
+    def get(self):
+        """Возвращает копию времени этапов
+
+        Returns:
+            dict: название этапа -> {'count', 'total', 'last', 'max'}
+        """
+        with self.lock:
+            return {stage_name: dict(timing) for stage_name, timing in self.stages.items()}
+
+    def format(self):
+        """Возвращает время последнего выполнения этапов одной строкой
+        """
+        return ', '.join(f"{stage_name}: {timing['last']:.2f} s" for stage_name, timing in self.get().items())
+
+
+class Stage(threading.Thread):
+    """Этап конвейера: берет данные из входной очереди, обрабатывает их и кладет результат в выходную
+
+    Этап-источник (без входной очереди) вызывает свою функцию в цикле, пока конвейер не остановят.
+    Если функция вернула None, в следующую очередь ничего не передается.
+    cProfile профилирует только свой поток, поэтому у каждого этапа свой профилировщик
+    """
+
+    def __init__(self, name: str, func, input_queue: queue.Queue, output_queue: queue.Queue,
+                 timings: StageTimings, stop_event: threading.Event, on_done=None, profile_dir: str = None):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.timings = timings
+        self.stop_event = stop_event
+        self.on_done = on_done # вызывается после обработки данных последним этапом
+        self.profile_dir = profile_dir # куда сохранить профиль этапа, None - не профилировать
+        self.profiler = cProfile.Profile() if profile_dir is not None else None
+
+    def call(self, args: tuple):
+        if self.profiler is None:
+            return self.func(*args)
+        return self.profiler.runcall(self.func, *args)
+
+    def dump_profile(self):
+        """Сохраняет профиль этапа в файл <profile_dir>/<название этапа>.prof (смотреть через pstats или snakeviz)
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.profiler.dump_stats(os.path.join(self.profile_dir, f'{self.name}.prof'))
+
+    def run(self):
+        while True:
+            if self.input_queue is None:
+                if self.stop_event.is_set():
+                    break
+                args = ()
+            else:
+                data = self.input_queue.get()
+                if data is STOP: # до сигнала остановки этап успевает обработать все, что уже было в очереди
+                    break
+                args = (data,)
+            start = time.perf_counter()
+            try:
+                result = self.call(args)
+            except Exception as e: # ошибка в одном цикле не должна останавливать весь конвейер
+                print(f'Ошибка на этапе {self.name}: {e!r}')
+                continue
+            if result is None and self.input_queue is None:
+                continue # источнику нечего передать дальше (например, снимок не изменился), это не считается работой этапа
+            self.timings.record(self.name, time.perf_counter() - start)
+            if self.output_queue is not None:
+                if result is not None:
+                    self.output_queue.put(result) # если следующий этап не успевает, ждем его
+            elif self.on_done is not None:
+                self.on_done()
+        if self.output_queue is not None:
+            self.output_queue.put(STOP)
+
+
+class Pipeline:
+    """Конвейер из этапов, работающих в отдельных потоках и связанных ограниченными очередями
+
+    Пока один снимок проверяется или выводится, следующий уже может скачиваться,
+    а медленный вывод не задерживает опрос базы данных: ограниченные очереди не дают этапам убегать вперед
+    """
+
+    def __init__(self, queue_size: int = 1, log_timings: bool = False, profile_dir: str = None):
+        self.queue_size = queue_size
+        self.log_timings = log_timings # выводить ли время этапов после каждого прошедшего через конвейер снимка
+        self.profile_dir = profile_dir # каталог для профилей этапов, None - без профилирования
+        self.timings = StageTimings()
+        self.stop_event = threading.Event()
+        self.stage_funcs = [] # пары (название этапа, функция)
+        self.stages = []
+
+    def add_stage(self, name: str, func):
+        """Добавляет этап; первый добавленный этап - источник, его функция вызывается без аргументов
+
+        Args:
+            name (str): название этапа
+            func (callable): функция этапа
+        """
+        self.stage_funcs.append((name, func))
+
+    def start(self):
+        input_queue = None
+        for number, (name, func) in enumerate(self.stage_funcs):
+            is_last = number == len(self.stage_funcs) - 1
+            output_queue = None if is_last else queue.Queue(maxsize=self.queue_size)
+            on_done = self.print_timings if is_last and self.log_timings else None
+            self.stages.append(Stage(name, func, input_queue, output_queue, self.timings, self.stop_event, on_done, self.profile_dir))
+            input_queue = output_queue
+        for stage in self.stages:
+            stage.start()
+
+    def print_timings(self):
+        print(f'Время этапов: {self.timings.format()}')
+
+    def stop(self):
+        """Останавливает конвейер: источник перестает выдавать данные, остальные этапы дорабатывают очередь
+        """
+        self.stop_event.set()
+
+    def is_alive(self):
+        return any(stage.is_alive() for stage in self.stages)
+
+    def join(self, timeout: float = None):
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def dump_profiles(self):
+        """Сохраняет профили остановившихся этапов; профиль этапа, который еще работает, не сохраняется,
+        так как профилировщик в этот момент включен в его потоке
+        """
+        for stage in self.stages:
+            if stage.profiler is not None and not stage.is_alive():
+                stage.dump_profile()
+
+    def run(self):
+        """Запускает конвейер и ждет его остановки (в том числе по Ctrl+C)
+        """
+        run_pipelines([self])
+
+
+def run_pipelines(pipelines: list):
+    """Запускает несколько конвейеров одновременно и ждет их остановки (в том числе по Ctrl+C)
+
+    По Ctrl+C конвейеры останавливаются, и этапы дорабатывают то, что уже попало в очереди:
+    скачанные снимки разбираются и записываются в market.db. Повторный Ctrl+C завершает работу сразу
+
+    Args:
+        pipelines (list): конвейеры (Pipeline)
+    """
+    for market_pipeline in pipelines:
+        market_pipeline.start()
+    try:
+        join_pipelines(pipelines)
+    except KeyboardInterrupt:
+        print('Остановка: этапы дорабатывают текущие снимки, повторный Ctrl+C - выход сразу')
+        for market_pipeline in pipelines:
+            market_pipeline.stop()
+        try:
+            join_pipelines(pipelines)
+        except KeyboardInterrupt:
+            print('Выход без ожидания этапов')
+    finally:
+        # профили сохраняются здесь, а не в потоках этапов: этапы - daemon-потоки и при выходе могут не успеть их записать
+        for market_pipeline in pipelines:
+            market_pipeline.dump_profiles()
+
+def join_pipelines(pipelines: list):
+    """Ждет остановки всех конвейеров; join с таймаутом, чтобы Ctrl+C доходил до главного потока
+    """
+    while any(market_pipeline.is_alive() for market_pipeline in pipelines):
+        for market_pipeline in pipelines:
+            market_pipeline.join(timeout=0.5)
@@ -1,7 +1,150 @@
+import os
+import tempfile
+import threading
+import time
+import zlib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
 import login
+from metrics import metrics
 
 
+# заголовки, которые отправляются с каждым запросом сессии
+HEADERS = {
+    'user-agent': 'Mozilla/5.0 (Windows NT 6.3; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.99 Safari/537.36 OPR/83.0.4254.66',
+}
+# заголовки для запросов html-страниц (как у браузера)
+HTML_HEADERS = {
+    'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
+}
+
+# статусы ответа, которые означают, что сессия на маркете истекла и нужно заново войти в аккаунт
+AUTH_ERROR_STATUSES = (401, 403)
+
+_session = None # общая сессия бота, создается при первом запросе
+_relogin_lock = threading.Lock() # повторный вход выполняет только один поток за раз
+_last_relogin = {'at': None, 'success': False} # когда был последний повторный вход и удался ли он
+
+def get_accept_encoding():
+    """Возвращает поддерживаемые способы сжатия ответа
+
+    brotli урезает ответы сильнее gzip, но requests умеет его распаковывать, только если установлен пакет brotli
+
+    Returns:
+        str: значение заголовка Accept-Encoding
+    """
+    try:
+        import brotli # noqa: F401
+    except ImportError:
+        return 'gzip, deflate'
+    return 'gzip, deflate, br'
+
+def create_session():
+    """Создает сессию с пулом постоянных соединений (keep-alive), сжатием ответов и повтором неудачных запросов
+
+    Returns:
+        requests.Session: сессия бота
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=config.REQUEST_RETRIES,
+        backoff_factor=config.REQUEST_BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504), # временные ошибки сервера
+        raise_on_status=False, # после последней попытки отдаем ответ как есть
+    )
+    adapter = HTTPAdapter(pool_connections=config.REQUEST_POOL_SIZE, pool_maxsize=config.REQUEST_POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    session.headers['accept-encoding'] = get_accept_encoding()
+    set_session_cookies(session, login.load_cookies()) # куки считываем с диска один раз на сессию
+    return session
+
+def set_session_cookies(session: requests.Session, cookies: list):
+    """Заменяет куки сессии на переданные
+
+    Args:
+        session (requests.Session): сессия бота
+        cookies (list): список словарей с cookie в формате selenium
+    """
+    session.cookies.clear()
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+
+def get_session():
+    """Возвращает общую сессию бота, при первом вызове создает её
+
+    Returns:
+        requests.Session: сессия бота
+    """
+    global _session
+    if _session is None:
+        _session = create_session()
+    return _session
+
+def reload_cookies():
+    """Перечитывает куки из файла в сессию, например, после повторного входа в аккаунт
+    """
+    set_session_cookies(get_session(), login.load_cookies())
+
+def relogin():
+    """Заново входит в аккаунт, если сессия истекла посреди работы бота
+
+    Вход через браузер долгий, поэтому выполняется не чаще раза в config.RELOGIN_MIN_INTERVAL секунд:
+    запросы, получившие ошибку авторизации за это время, пользуются результатом последнего входа
+
+    Returns:
+        bool: True, если после входа запрос стоит повторить со свежими cookies
+    """
+    with _relogin_lock:
+        if _last_relogin['at'] is not None and time.monotonic() - _last_relogin['at'] < config.RELOGIN_MIN_INTERVAL:
+            return _last_relogin['success']
+        print('Сессия истекла, выполняется повторный вход в аккаунт')
+        _last_relogin['success'] = False
+        try:
+            _last_relogin['success'] = login.login_to_steam() # при успехе cookies сессии перечитываются
+        finally:
+            # время входа запоминаем и при исключении, иначе каждая следующая ошибка авторизации снова запустит браузер
+            _last_relogin['at'] = time.monotonic()
+        return _last_relogin['success']
+
+def send_request(method: str, url: str, auth: bool = False, **kwargs):
+    """Отправляет запрос через общую сессию; при ошибке авторизации на странице, требующей входа, заново входит в аккаунт
+    и повторяет запрос
+
+    Args:
+        method (str): http-метод
+        url (str): url-адрес
+        auth (bool): требует ли запрос входа в аккаунт маркета; 401/403 от публичных адресов (itemdb, float, webhook)
+            означают не истекшую сессию, и вход через браузер из-за них не запускается
+        **kwargs: параметры requests.Session.request
+
+    Returns:
+        requests.Response: ответ сервера
+    """
+    kwargs.setdefault('timeout', config.REQUEST_TIMEOUT)
+    session = get_session()
+    response = request_with_metrics(session, method, url, **kwargs)
+    if auth and response.status_code in AUTH_ERROR_STATUSES and relogin():
+        response.close()
+        response = request_with_metrics(session, method, url, **kwargs)
+    return response
+
+def request_with_metrics(session: requests.Session, method: str, url: str, **kwargs):
+    """Отправляет запрос и учитывает в метриках его статус и время до получения заголовков ответа
+    """
+    start = time.perf_counter()
+    try:
+        response = session.request(method, url, **kwargs)
+    except requests.RequestException as e:
+        metrics.inc('http_errors_total', error=type(e).__name__)
+        raise
+    metrics.observe('http_request_seconds', time.perf_counter() - start, method=method)
+    metrics.inc('http_responses_total', status=response.status_code)
+    return response
+
 def get_content(url: str, **kwargs):
     """Возвращает содержимое ответа сервера
 
@@ -10,12 +153,6 @@ def get_content(url: str, **kwargs):
     Returns:
         str or dict: ответ сервера
     """
-    cookies = login.get_cookies()
-    headers = {
-        'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
-        'user-agent': 'Mozilla/5.0 (Windows NT 6.3; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.99 Safari/537.36 OPR/83.0.4254.66',
-        'cookie': cookies
-    }
     if kwargs:
         # если передали флаг key, то ожидаем получить api_key аккаунта через post-запрос
         if kwargs['flag'] == 'key':
@@ -23,22 +160,77 @@ def get_content(url: str, **kwargs):
                 'action': kwargs['action'],
                 '_csrf': kwargs['csrf_token']
             }
-            response = requests.post(url, data=payload, headers=headers) # post-запрос для генерации токена
+            response = send_request('POST', url, auth=True, data=payload, headers=HTML_HEADERS) # post-запрос для генерации токена
             return response.content
         # если передали флаг json, то ожидаем получить ответ сервера в json формате
         elif kwargs['flag'] == 'json':
             # если передали параметр req, то ожидаем получить float
             if 'req' in kwargs:
                 data = {'req': kwargs['req']} # передаем хэш предмета для запроса float
-                response = requests.post(url, data=data) # api требует отправить post-запрос с хэшем
+                response = send_request('POST', url, data=data) # api требует отправить post-запрос с хэшем
             else:
-                response = requests.get(url)
+                response = send_request('GET', url)
             return response.json()
         # если передали флаг html, то ожижаем получить html страницу, соответственно отправляем заголовки
         elif kwargs['flag'] == 'html':
-            response = requests.get(url, headers=headers)
+            response = send_request('GET', url, auth=True, headers=HTML_HEADERS) # страницы аккаунта доступны только после входа
             return response.content
     # если не было передано ни одного ключевого параметра, то ожидаем получить название файла базы данных, возвращаем текст ответа
     else:
-        response = requests.get(url)
-        return response.text
\ No newline at end of file
+        response = send_request('GET', url)
+        return response.text
+
+def get_response(url: str, headers: dict = None):
+    """Возвращает ответ сервера целиком: вместе со статусом и заголовками
+
+    Нужен для условных запросов (If-None-Match, If-Modified-Since), когда важен не только текст ответа
+
+    Args:
+        url (str): url-адрес
+        headers (dict, optional): дополнительные заголовки запроса
+
+    Returns:
+        requests.Response: ответ сервера
+    """
+    return send_request('GET', url, headers=headers)
+
+def download_to_file(url: str, file_name: str, chunk_size: int = 1024 * 1024):
+    """Скачивает файл по частям сразу на диск, не держа весь ответ в памяти
+
+    Ответ пишется во временный файл рядом с file_name и подменяет его только после полного скачивания,
+    поэтому при обрыве соединения старый файл остается целым. Сжатие ответа (Content-Encoding: gzip/br)
+    снимается автоматически, файлы с расширением .gz дополнительно распаковываются на лету
+
+    Args:
+        url (str): url-адрес файла
+        file_name (str): куда сохранить файл
+        chunk_size (int): размер части в байтах
+
+    Returns:
+        int: кол-во записанных байт
+    """
+    # wbits=16+MAX_WBITS - распаковка формата gzip
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if url.endswith('.gz') else None
+    written = 0
+    start = time.perf_counter()
+    with send_request('GET', url, stream=True) as response:
+        response.raise_for_status()
+        fd, tmp_file_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if decompressor is not None:
+                        chunk = decompressor.decompress(chunk)
+                    file.write(chunk)
+                    written += len(chunk)
+                if decompressor is not None:
+                    tail = decompressor.flush()
+                    file.write(tail)
+                    written += len(tail)
+            os.replace(tmp_file_name, file_name) # атомарная подмена файла
+        except BaseException:
+            os.remove(tmp_file_name)
+            raise
+    metrics.inc('download_bytes_total', written)
+    metrics.observe('download_seconds', time.perf_counter() - start)
+    return written
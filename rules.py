@@ -0,0 +1,180 @@
+import json
+from typing import NamedTuple, Optional
+
+
+class Rule(NamedTuple):
+    """Скомпилированное правило поиска предметов
+
+    Названия стикеров уже заменены на их ID, цена переведена в копейки, строки приведены к нижнему регистру
+    """
+    name: str # название правила, выводится вместе с найденным предметом
+    sticker_ids: frozenset # ID стикеров правила; пустое множество - правило не зависит от стикеров
+    min_stickers: int # сколько стикеров из sticker_ids должно быть на предмете (повторы одного стикера считаются)
+    max_price: Optional[int] # максимальная цена в копейках
+    qualities: Optional[frozenset] # допустимые качества предмета
+    name_contains: Optional[str] # подстрока, которая должна быть в названии предмета
+    min_sticker_count: int # минимальное общее кол-во стикеров на предмете
+
+    def check(self, item):
+        """Проверяет условия правила, не связанные со стикерами из sticker_ids
+
+        Args:
+            item (itemdb.MarketItem): предмет маркета
+
+        Returns:
+            bool: True, если предмет подходит под правило
+        """
+        if self.max_price is not None and item.price > self.max_price:
+            return False
+        if self.qualities is not None and item.quality.casefold() not in self.qualities:
+            return False
+        if self.name_contains is not None and self.name_contains not in item.name.casefold():
+            return False
+        return len(item.sticker_ids) >= self.min_sticker_count
+
+
+def load_rules(file_name: str = 'rules.json'):
+    """Считывает правила поиска из json-файла
+
+    Формат файла:
+    {
+        "rules": [
+            {
+                "name": "Три стикера Katowice 2014 дешевле 5000 руб.",
+                "stickers": ["Sticker | iBUYPOWER | Katowice 2014", "Sticker | Titan | Katowice 2014"],
+                "min_stickers": 3,
+                "max_price": 5000,
+                "qualities": ["Field-Tested", "Minimal Wear"],
+                "name_contains": "AK-47",
+                "min_sticker_count": 3
+            }
+        ]
+    }
+    Все поля, кроме name, необязательные; max_price указывается в рублях
+
+    Args:
+        file_name (str): имя файла с правилами
+
+    Returns:
+        list: список словарей с правилами
+    """
+    with open(file_name, 'r', encoding='utf-8') as f:
+        return json.load(f)['rules']
+
+
+def compile_rule(rule: dict, catalogue):
+    """Компилирует правило из файла: заменяет названия стикеров на ID, цену - на копейки
+
+    Args:
+        rule (dict): правило из файла правил
+        catalogue (sticker_catalogue.StickerCatalogue): справочник стикеров
+
+    Returns:
+        Rule: скомпилированное правило
+    """
+    sticker_ids = set()
+    for sticker_name in rule.get('stickers', []):
+        found_ids = catalogue.get_ids(sticker_name)
+        if not found_ids:
+            print(f"Правило '{rule['name']}': стикер '{sticker_name}' не найден в базе всех стикеров")
+        sticker_ids.update(found_ids)
+    if rule.get('stickers') and not sticker_ids:
+        print(f"Правило '{rule['name']}' не будет работать: ни один его стикер не найден")
+    max_price = rule.get('max_price')
+    qualities = rule.get('qualities')
+    name_contains = rule.get('name_contains')
+    return Rule(
+        name=rule['name'],
+        sticker_ids=frozenset(sticker_ids),
+        min_stickers=rule.get('min_stickers', 1) if rule.get('stickers') else 0,
+        max_price=round(max_price * 100) if max_price is not None else None,
+        qualities=frozenset(quality.casefold() for quality in qualities) if qualities else None,
+        name_contains=name_contains.casefold() if name_contains else None,
+        min_sticker_count=rule.get('min_sticker_count', 0),
+    )
+
+
+class RuleEngine:
+    """Проверяет предметы сразу по всем правилам за один проход
+
+    Правила со стикерами раскладываются в индекс ID стикера -> правила, поэтому для предмета проверяются только
+    правила, в которых есть хотя бы один из его стикеров. Правила без стикеров раскладываются по качеству.
+    Время проверки предмета зависит от кол-ва его стикеров, а не от кол-ва правил
+    """
+
+    def __init__(self, rules: list):
+        """
+        Args:
+            rules (list): скомпилированные правила (Rule)
+        """
+        self.rules = rules
+        self.sticker_index = {} # ID стикера -> номера правил с этим стикером
+        self.generic_rules_by_quality = {} # качество -> правила без стикеров только для этого качества
+        self.generic_rules = [] # правила без стикеров и без ограничения качества
+        for rule_number, rule in enumerate(rules):
+            if rule.sticker_ids:
+                for sticker_id in rule.sticker_ids:
+                    self.sticker_index.setdefault(sticker_id, []).append(rule_number)
+            elif rule.min_stickers:
+                continue # ни один стикер правила не найден в справочнике, такое правило сработать не может
+            elif rule.qualities is not None:
+                for quality in rule.qualities:
+                    self.generic_rules_by_quality.setdefault(quality, []).append(rule)
+            else:
+                self.generic_rules.append(rule)
+
+    @classmethod
+    def from_rules(cls, rules: list, catalogue):
+        """Компилирует правила из файла и создает по ним движок
+
+        Args:
+            rules (list): правила в виде словарей, см. load_rules
+            catalogue (sticker_catalogue.StickerCatalogue): справочник стикеров
+
+        Returns:
+            RuleEngine: движок правил
+        """
+        return cls([compile_rule(rule, catalogue) for rule in rules])
+
+    def match(self, item):
+        """Возвращает правила, под которые подходит предмет
+
+        Args:
+            item (itemdb.MarketItem): предмет маркета
+
+        Returns:
+            list: подошедшие правила, пустой список, если предмет не подошел ни под одно
+        """
+        matched_rules = []
+        if item.sticker_ids and self.sticker_index:
+            sticker_counts = {} # номер правила -> сколько стикеров правила на предмете
+            for sticker_id in item.sticker_ids:
+                for rule_number in self.sticker_index.get(sticker_id, ()):
+                    sticker_counts[rule_number] = sticker_counts.get(rule_number, 0) + 1
+            for rule_number, count in sticker_counts.items():
+                rule = self.rules[rule_number]
+                if count >= rule.min_stickers and rule.check(item):
+                    matched_rules.append(rule)
+        for rule in self.generic_rules_by_quality.get(item.quality.casefold(), ()):
+            if rule.check(item):
+                matched_rules.append(rule)
+        for rule in self.generic_rules:
+            if rule.check(item):
+                matched_rules.append(rule)
+        return matched_rules
+
+    def match_items(self, items):
+        """Проверяет предметы по всем правилам
+
+        Args:
+            items (iterable): предметы маркета
+
+        Returns:
+            list: пары (предмет, подошедшие правила) для подошедших предметов
+        """
+        matches = []
+        for item in items:
+            matched_rules = self.match(item)
+            if matched_rules:
+                matches.append((item, matched_rules))
+        return matches
@@ -0,0 +1,88 @@
+import random
+import statistics
+import threading
+import time
+from collections import deque
+import config
+
+
+class PollScheduler:
+    """Планировщик опроса current_730.json, подстраивающийся под расписание обновления базы данных маркета
+
+    Запоминает моменты, когда появлялись новые снимки, и оценивает по ним период обновления.
+    До ожидаемого появления снимка бот спит, а рядом с ним часто и дешево опрашивает current_730.json,
+    поэтому новый снимок скачивается через несколько секунд после публикации, а не через минуту.
+    При ошибках пауза растет экспоненциально со случайным разбросом
+    """
+
+    def __init__(self, default_period: float = config.POLL_DEFAULT_PERIOD, lead: float = config.POLL_LEAD,
+                 fast_interval: float = config.POLL_FAST_INTERVAL, slow_interval: float = config.POLL_SLOW_INTERVAL,
+                 error_backoff: float = config.POLL_ERROR_BACKOFF, max_backoff: float = config.POLL_MAX_BACKOFF,
+                 stop_event: threading.Event = None):
+        self.default_period = default_period # период обновления, пока его не удалось оценить
+        self.lead = lead # за сколько секунд до ожидаемого снимка начинать частый опрос
+        self.fast_interval = fast_interval # пауза между опросами рядом с ожидаемым снимком
+        self.slow_interval = slow_interval # пауза между опросами, если снимок сильно запаздывает
+        self.error_backoff = error_backoff # начальная пауза после ошибки
+        self.max_backoff = max_backoff # максимальная пауза после ошибок
+        self.changes = deque(maxlen=16) # моменты появления последних снимков
+        self.errors = 0 # кол-во ошибок подряд
+        self.polls = 0 # сколько раз опрашивали сервер
+        self.stop_event = stop_event if stop_event is not None else threading.Event() # прерывает ожидание при остановке
+
+    @property
+    def period(self):
+        """Оценка периода обновления базы данных - медиана интервалов между последними снимками
+        """
+        if len(self.changes) < 3: # первый снимок скачан при запуске, момент его публикации неизвестен
+            return self.default_period
+        intervals = [later - earlier for earlier, later in zip(list(self.changes)[1:], list(self.changes)[2:])]
+        return statistics.median(intervals)
+
+    def record_change(self, now: float = None):
+        """Отмечает, что появился новый снимок
+        """
+        self.changes.append(time.monotonic() if now is None else now)
+        self.polls += 1
+        self.errors = 0
+
+    def record_unchanged(self):
+        """Отмечает, что снимок не изменился
+        """
+        self.polls += 1
+        self.errors = 0
+
+    def record_error(self):
+        """Отмечает ошибку при опросе или скачивании
+        """
+        self.polls += 1
+        self.errors += 1
+
+    def next_delay(self, now: float = None):
+        """Возвращает, сколько секунд ждать до следующего опроса
+
+        Returns:
+            float: пауза в секундах
+        """
+        if self.errors: # проверяется до первого опроса: после неудачного опроса пауза не может быть нулевой
+            backoff = min(self.max_backoff, self.error_backoff * 2 ** (self.errors - 1))
+            return backoff * random.uniform(0.5, 1.5) # разброс, чтобы несколько ботов не долбили сервер одновременно
+        if not self.polls: # первый опрос - сразу после запуска
+            return 0
+        if not self.changes:
+            return self.fast_interval
+        now = time.monotonic() if now is None else now
+        expected = self.changes[-1] + self.period # когда ожидается следующий снимок
+        if now < expected - self.lead:
+            return expected - self.lead - now # спим до начала частого опроса
+        if now < expected + self.period / 2:
+            return self.fast_interval
+        return self.slow_interval # снимок сильно запаздывает, не стоит часто опрашивать сервер
+
+    def wait(self):
+        """Ждет до следующего опроса; пауза после ошибок доходит до нескольких минут, поэтому ожидание прерывается остановкой
+
+        Returns:
+            bool: True, если ожидание прервано остановкой и опрашивать больше не нужно
+        """
+        return self.stop_event.wait(self.next_delay())
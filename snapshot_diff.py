@@ -0,0 +1,55 @@
+from typing import NamedTuple
+
+
+class SnapshotDiff(NamedTuple):
+    """Изменения между двумя последовательными снимками базы данных маркета
+    """
+    added: list # предметы, которых не было в прошлом снимке
+    removed: list # предметы из прошлого снимка, которых больше нет на продаже
+    price_changed: list # предметы, у которых поменялась цена (в новом виде)
+
+    @property
+    def changed(self):
+        """Новые предметы и предметы с изменившейся ценой - только их имеет смысл заново проверять и выводить
+        """
+        return self.added + self.price_changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.price_changed)
+
+
+def index_market_items(market_items):
+    """Индексирует снимок базы данных по ключам предметов
+
+    Args:
+        market_items (iterable): предметы маркета (itemdb.MarketItem)
+
+    Returns:
+        dict: снимок вида {(ClassID, InstanceID): предмет}
+    """
+    return {item.key: item for item in market_items}
+
+
+def diff_snapshots(previous: dict, current: dict):
+    """Сравнивает два снимка базы данных и возвращает изменения между ними
+
+    Строки сравниваются по ключу (ClassID, InstanceID) и цене: предмет с тем же ключом, но другой ценой
+    считается изменившимся, а изменения остальных полей (например, кол-ва) не учитываются
+
+    Args:
+        previous (dict): прошлый снимок вида {(ClassID, InstanceID): предмет}
+        current (dict): текущий снимок вида {(ClassID, InstanceID): предмет}
+
+    Returns:
+        SnapshotDiff: добавленные, удаленные и изменившиеся в цене предметы
+    """
+    added = []
+    price_changed = []
+    for item_key, item in current.items():
+        previous_item = previous.get(item_key)
+        if previous_item is None:
+            added.append(item)
+        elif previous_item.price != item.price:
+            price_changed.append(item)
+    removed = [item for item_key, item in previous.items() if item_key not in current]
+    return SnapshotDiff(added, removed, price_changed)
@@ -0,0 +1,53 @@
+def normalize_sticker_name(name: str):
+    """Приводит название стикера к виду для нечувствительного к регистру и пробелам поиска
+
+    Args:
+        name (str): название стикера
+
+    Returns:
+        str: название в нижнем регистре с одиночными пробелами
+    """
+    return ' '.join(name.casefold().split())
+
+
+class StickerCatalogue:
+    """Справочник всех стикеров площадки с поиском по ID и по названию за одно обращение к словарю
+    """
+
+    def __init__(self, stickers: list):
+        """
+        Args:
+            stickers (list): список словарей со стикерами вида {'id': ..., 'name': ...}
+        """
+        self.stickers = stickers
+        self.id_to_name = {} # ID стикера -> название
+        self.name_to_ids = {} # название стикера -> список ID (у разных стикеров название может совпадать)
+        self.normalized_name_to_ids = {} # нормализованное название -> список ID
+        for sticker in stickers:
+            self.id_to_name[sticker['id']] = sticker['name']
+            self.name_to_ids.setdefault(sticker['name'], []).append(sticker['id'])
+            self.normalized_name_to_ids.setdefault(normalize_sticker_name(sticker['name']), []).append(sticker['id'])
+
+    def __len__(self):
+        return len(self.id_to_name)
+
+    def get_name(self, sticker_id: str):
+        """Возвращает название стикера по его ID или None, если такого стикера нет
+        """
+        return self.id_to_name.get(sticker_id)
+
+    def get_ids(self, sticker_name: str):
+        """Возвращает ID стикеров с переданным названием
+
+        Сначала ищется точное совпадение, затем - без учета регистра и лишних пробелов
+
+        Args:
+            sticker_name (str): название стикера
+
+        Returns:
+            list: ID найденных стикеров, пустой список, если ничего не нашлось
+        """
+        sticker_ids = self.name_to_ids.get(sticker_name)
+        if sticker_ids is None:
+            sticker_ids = self.normalized_name_to_ids.get(normalize_sticker_name(sticker_name), [])
+        return sticker_ids
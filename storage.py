@@ -0,0 +1,314 @@
+import sqlite3
+import threading
+import time
+import itemdb
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    feed TEXT NOT NULL DEFAULT '',
+    db_name TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    items INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    removed INTEGER NOT NULL,
+    price_changed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS item_events (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    feed TEXT NOT NULL DEFAULT '',
+    kind TEXT NOT NULL,
+    classid INTEGER NOT NULL,
+    instanceid INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    hash_name TEXT NOT NULL,
+    sticker_ids TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS item_events_item ON item_events (classid, instanceid);
+CREATE INDEX IF NOT EXISTS item_events_snapshot ON item_events (snapshot_id);
+CREATE TABLE IF NOT EXISTS item_event_stickers (
+    sticker_id TEXT NOT NULL,
+    event_id INTEGER NOT NULL -- rowid записи item_events
+);
+CREATE INDEX IF NOT EXISTS item_event_stickers_sticker ON item_event_stickers (sticker_id, event_id);
+CREATE TABLE IF NOT EXISTS price_history (
+    feed TEXT NOT NULL DEFAULT '',
+    hash_name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS price_history_feed_hash_name ON price_history (feed, hash_name, recorded_at);
+CREATE TABLE IF NOT EXISTS hits (
+    watchlist TEXT NOT NULL DEFAULT '',
+    classid INTEGER NOT NULL,
+    instanceid INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    hash_name TEXT NOT NULL,
+    sticker_ids TEXT NOT NULL,
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    found_at REAL NOT NULL,
+    removed_at REAL
+);
+CREATE INDEX IF NOT EXISTS hits_item ON hits (watchlist, classid, instanceid, removed_at);
+'''
+
+def format_sticker_ids(sticker_ids):
+    """Приводит ID стикеров к строке вида |id1|id2|, по которой удобно искать стикер через LIKE '%|id|%'
+    """
+    return '|' + '|'.join(sticker_ids) + '|' if sticker_ids else ''
+
+def parse_sticker_ids(sticker_ids: str):
+    """Разбирает строку вида |id1|id2| обратно в ID стикеров
+    """
+    return tuple(sticker_id for sticker_id in sticker_ids.split('|') if sticker_id)
+
+
+class MarketStore:
+    """Локальное хранилище истории площадки на SQLite: снимки, изменения предметов, история цен и найденные предметы
+
+    В базу пишутся только изменения между снимками, поэтому объем записи за цикл пропорционален изменениям на площадке.
+    История каждой ленты хранится со своим именем ленты (столбец feed), чтобы цены разных площадок не смешивались
+    """
+
+    def __init__(self, file_name: str = 'market.db', default_feed: str = ''):
+        """
+        Args:
+            file_name (str): файл базы данных SQLite
+            default_feed (str): лента по умолчанию (основная), ей же принадлежит история, записанная прошлыми версиями бота
+        """
+        self.default_feed = default_feed
+        # хранилищем пользуются потоки всех лент, запись идет по очереди под self.lock
+        self.connection = sqlite3.connect(file_name, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute('PRAGMA journal_mode=WAL') # чтение не блокирует запись
+        self.connection.execute('PRAGMA synchronous=NORMAL') # в режиме WAL это безопасно и намного быстрее FULL
+        index_stickers = self.migrate()
+        self.connection.executescript(SCHEMA)
+        if index_stickers:
+            self.index_event_stickers()
+
+    def migrate(self):
+        """Дополняет таблицы, созданные прошлыми версиями бота
+
+        Returns:
+            bool: True, если изменения предметов уже есть, а таблицы стикеров изменений еще нет и ее нужно заполнить
+        """
+        tables = {row[0] for row in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        hits_columns = [row[1] for row in self.connection.execute('PRAGMA table_info(hits)')]
+        if hits_columns and 'watchlist' not in hits_columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE hits ADD COLUMN watchlist TEXT NOT NULL DEFAULT ''")
+                self.connection.execute('DROP INDEX IF EXISTS hits_item')
+        # история, записанная до появления нескольких лент, принадлежит основной ленте
+        for table in ('snapshots', 'item_events', 'price_history'):
+            columns = [row[1] for row in self.connection.execute(f'PRAGMA table_info({table})')]
+            if columns and 'feed' not in columns:
+                with self.connection:
+                    self.connection.execute(f"ALTER TABLE {table} ADD COLUMN feed TEXT NOT NULL DEFAULT ''")
+                    self.connection.execute(f'UPDATE {table} SET feed = ?', (self.default_feed,))
+        self.connection.execute('DROP INDEX IF EXISTS price_history_hash_name')
+        return 'item_events' in tables and 'item_event_stickers' not in tables
+
+    def index_event_stickers(self):
+        """Заполняет таблицу стикеров по уже записанным изменениям предметов (один раз после обновления бота)
+        """
+        rows = self.connection.execute("SELECT rowid, sticker_ids FROM item_events WHERE kind != 'removed' AND sticker_ids != ''")
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO item_event_stickers (sticker_id, event_id) VALUES (?, ?)',
+                ((sticker_id, event_id) for event_id, sticker_ids in rows.fetchall() for sticker_id in parse_sticker_ids(sticker_ids))
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def record_snapshot(self, db_name: str, market_diff, items_count: int, feed: str = None):
+        """Сохраняет снимок базы данных: сам факт снимка, изменения предметов и новые цены
+
+        Args:
+            db_name (str): имя файла базы данных маркета
+            market_diff (snapshot_diff.SnapshotDiff): изменения с прошлого снимка
+            items_count (int): кол-во предметов в снимке
+            feed (str, optional): имя ленты снимка, по умолчанию - основная
+
+        Returns:
+            int: ID снимка в хранилище
+        """
+        feed = self.default_feed if feed is None else feed
+        now = time.time()
+        with self.lock, self.connection: # одна транзакция на весь снимок
+            cursor = self.connection.execute(
+                'INSERT INTO snapshots (feed, db_name, fetched_at, items, added, removed, price_changed) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (feed, db_name, now, items_count, len(market_diff.added), len(market_diff.removed), len(market_diff.price_changed))
+            )
+            snapshot_id = cursor.lastrowid
+            # rowid изменений задаются явно, чтобы сразу записать их стикеры; запись идет внутри транзакции, другой писатель не вклинится
+            first_event_id = self.connection.execute('SELECT COALESCE(MAX(rowid), 0) + 1 FROM item_events').fetchone()[0]
+            events = [
+                (kind, item)
+                for kind, items in (('added', market_diff.added), ('removed', market_diff.removed), ('price_changed', market_diff.price_changed))
+                for item in items
+            ]
+            self.connection.executemany(
+                'INSERT INTO item_events (rowid, snapshot_id, feed, kind, classid, instanceid, price, name, hash_name, sticker_ids) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (event_id, snapshot_id, feed, kind, item.classid, item.instanceid, item.price, item.name, item.hash_name, format_sticker_ids(item.sticker_ids))
+                    for event_id, (kind, item) in enumerate(events, first_event_id)
+                )
+            )
+            # проданные предметы в поиске самого дешевого выставления не участвуют, их стикеры не индексируются
+            self.connection.executemany(
+                'INSERT INTO item_event_stickers (sticker_id, event_id) VALUES (?, ?)',
+                (
+                    (sticker_id, event_id)
+                    for event_id, (kind, item) in enumerate(events, first_event_id) if kind != 'removed'
+                    for sticker_id in item.sticker_ids
+                )
+            )
+            self.connection.executemany(
+                'INSERT INTO price_history (feed, hash_name, price, recorded_at) VALUES (?, ?, ?, ?)',
+                ((feed, item.hash_name, item.price, now) for item in market_diff.changed if item.hash_name)
+            )
+        return snapshot_id
+
+    def update_hits(self, snapshot_id: int, found_items: list, removed_items: list, watchlist: str = ''):
+        """Обновляет таблицу найденных предметов: закрывает проданные и записывает новые
+
+        Args:
+            snapshot_id (int): ID снимка, в котором предметы были найдены
+            found_items (list): новые найденные предметы (или старые с новой ценой)
+            removed_items (list): предметы, которых больше нет на площадке
+            watchlist (str): имя списка наблюдения, которому принадлежат предметы
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            # у предмета с новой ценой закрываем старую запись, чтобы активной была только одна
+            self.connection.executemany(
+                'UPDATE hits SET removed_at = ? WHERE watchlist = ? AND classid = ? AND instanceid = ? AND removed_at IS NULL',
+                ((now, watchlist, item.classid, item.instanceid) for item in [*removed_items, *found_items])
+            )
+            self.connection.executemany(
+                'INSERT INTO hits (watchlist, classid, instanceid, price, name, hash_name, sticker_ids, snapshot_id, found_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (watchlist, item.classid, item.instanceid, item.price, item.name, item.hash_name, format_sticker_ids(item.sticker_ids), snapshot_id, now)
+                    for item in found_items
+                )
+            )
+
+    def get_active_hits(self, watchlist: str = ''):
+        """Возвращает найденные предметы списка наблюдения, которые еще на продаже
+
+        Args:
+            watchlist (str): имя списка наблюдения
+
+        Returns:
+            list: кортежи (classid, instanceid, price, name, hash_name, found_at)
+        """
+        return self.connection.execute(
+            'SELECT classid, instanceid, price, name, hash_name, found_at FROM hits WHERE watchlist = ? AND removed_at IS NULL ORDER BY found_at',
+            (watchlist,)
+        ).fetchall()
+
+    def get_active_hit_items(self, watchlist: str = ''):
+        """Возвращает найденные предметы списка наблюдения, которые еще на продаже, в виде предметов маркета
+
+        Таблица hits - журнал найденных и проданных предметов, который пишется по мере изменений,
+        поэтому после перезапуска бот восстанавливает по ней найденные предметы и не уведомляет о них повторно.
+        Качество и кол-во в таблице не хранятся, у восстановленных предметов они пустые
+
+        Args:
+            watchlist (str): имя списка наблюдения
+
+        Returns:
+            list: предметы маркета (itemdb.MarketItem)
+        """
+        rows = self.connection.execute(
+            'SELECT classid, instanceid, price, name, hash_name, sticker_ids FROM hits WHERE watchlist = ? AND removed_at IS NULL',
+            (watchlist,)
+        )
+        return [
+            itemdb.MarketItem(classid, instanceid, price, 0, '', parse_sticker_ids(sticker_ids), name, hash_name)
+            for classid, instanceid, price, name, hash_name, sticker_ids in rows
+        ]
+
+    def compact_hits(self, max_age: float):
+        """Удаляет записи о давно проданных найденных предметах, чтобы таблица hits не росла бесконечно
+
+        Записи о предметах, которые еще на продаже, не удаляются
+
+        Args:
+            max_age (float): сколько секунд хранить записи о проданных предметах
+
+        Returns:
+            int: кол-во удаленных записей
+        """
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'DELETE FROM hits WHERE removed_at IS NOT NULL AND removed_at < ?', (time.time() - max_age,)
+            )
+        return cursor.rowcount
+
+    def compact_history(self, max_age: float):
+        """Удаляет старые снимки из истории изменений предметов и цен, чтобы market.db не росла бесконечно
+
+        Сами записи снимков маленькие и остаются: на них ссылаются найденные предметы
+
+        Args:
+            max_age (float): сколько секунд хранить историю
+
+        Returns:
+            int: кол-во удаленных изменений предметов
+        """
+        cutoff = time.time() - max_age
+        with self.lock, self.connection:
+            last_snapshot_id = self.connection.execute(
+                'SELECT MAX(id) FROM snapshots WHERE fetched_at < ?', (cutoff,)
+            ).fetchone()[0]
+            if last_snapshot_id is None:
+                return 0
+            self.connection.execute(
+                'DELETE FROM item_event_stickers WHERE event_id IN (SELECT rowid FROM item_events WHERE snapshot_id <= ?)', (last_snapshot_id,)
+            )
+            cursor = self.connection.execute('DELETE FROM item_events WHERE snapshot_id <= ?', (last_snapshot_id,))
+            self.connection.execute('DELETE FROM price_history WHERE recorded_at < ?', (cutoff,))
+        return cursor.rowcount
+
+    def get_price_history(self, hash_name: str, feed: str = None):
+        """Возвращает историю цен предмета
+
+        Args:
+            hash_name (str): hash название предмета
+            feed (str, optional): имя ленты, по умолчанию - основная
+
+        Returns:
+            list: кортежи (время, цена) в порядке времени
+        """
+        return self.connection.execute(
+            'SELECT recorded_at, price FROM price_history WHERE feed = ? AND hash_name = ? ORDER BY recorded_at',
+            (self.default_feed if feed is None else feed, hash_name)
+        ).fetchall()
+
+    def get_cheapest_listing(self, sticker_ids: list, feed: str = None):
+        """Ищет самое дешевое выставление предмета, на котором были все переданные стикеры
+
+        Args:
+            sticker_ids (list): ID стикеров
+            feed (str, optional): имя ленты, по умолчанию - основная
+
+        Returns:
+            tuple or None: (цена, время, classid, instanceid, название) или None, если такого предмета не было
+        """
+        # изменения со всеми стикерами ищутся по индексу item_event_stickers, а не перебором item_events
+        condition = (
+            'AND e.rowid IN (' + ' INTERSECT '.join(['SELECT event_id FROM item_event_stickers WHERE sticker_id = ?'] * len(sticker_ids)) + ')'
+            if sticker_ids else ''
+        )
+        return self.connection.execute(
+            'SELECT e.price, s.fetched_at, e.classid, e.instanceid, e.name FROM item_events e '
+            'JOIN snapshots s ON s.id = e.snapshot_id '
+            f"WHERE e.feed = ? AND e.kind != 'removed' {condition} ORDER BY e.price LIMIT 1",
+            [self.default_feed if feed is None else feed, *map(str, sticker_ids)]
+        ).fetchone()
@@ -0,0 +1,62 @@
+import http.server
+import threading
+import unittest
+import query
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Отвечает на любой GET коротким json по HTTP/1.1, не закрывая соединение
+    """
+    protocol_version = 'HTTP/1.1' # keep-alive
+
+    def do_GET(self):
+        body = b'{"db": "items.csv"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CountingServer(http.server.ThreadingHTTPServer):
+    """Локальный сервер-заглушка, считающий принятые соединения
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1 # вызывается один раз на каждое принятое соединение
+        super().process_request(request, client_address)
+
+
+class SessionReuseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = CountingServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/itemdb/current_730.json'
+        query._session = None # сессия создается заново для каждого теста
+
+    def tearDown(self):
+        query.get_session().close()
+        query._session = None
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_repeated_requests_reuse_one_connection(self):
+        for _ in range(5):
+            self.assertEqual(query.get_content(self.url, flag='json'), {'db': 'items.csv'})
+        self.assertEqual(self.server.connections, 1)
+
+    def test_get_session_returns_shared_session(self):
+        self.assertIs(query.get_session(), query.get_session())
+
+
+if __name__ == '__main__':
+    unittest.main()